@@ -1,17 +1,65 @@
+import hashlib
+import io
 import os
 import re
 import json
 from datetime import datetime
-import sys
 from pathlib import Path
+from typing import Optional
 from multiprocessing import Pool, cpu_count
+from file_rewriter import fingerprint_digest, rewrite_file
 from llm_backend import llm_interface
+from repo_snapshot import list_files
+
+LANGUAGES = {
+    '.py': 'Python',
+    '.js': 'JavaScript',
+    '.ts': 'TypeScript',
+    '.svelte': 'Svelte/JavaScript',
+}
+# Approximate size of one classification prompt; identifiers from many files are packed into each
+PROMPT_BUDGET_CHARS = 12000
+PROMPT_MAX_IDENTIFIERS = 300
+PY_IMPORT = re.compile(r'^\s*import\s+([\w\.]+)(?:\s+as\s+\w+)?', re.MULTILINE)
+PY_FROM_IMPORT = re.compile(r'^\s*from\s+([\w\.]+)\s+import\s+([\w,\s*]+)', re.MULTILINE)
+JS_IMPORT = re.compile(r'^\s*import\s+.*\s+from\s+[\'"]([^\'"]+)[\'"]', re.MULTILINE)
+
+
+def identifier_pattern(names):
+    """Compile names into one whole-word regex shaped like a trie.
+
+    Names sharing a prefix share a branch, so each position of the text is
+    tested against a handful of next characters instead of every name.
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A name ends here; longer names are tried first
+            return f'(?:{body})?'
+        return body
+
+    return re.compile(rf'(?<!\w){build(trie)}(?!\w)')
 
 
 class CamelCaseFinder:
-    def __init__(self):
+    def __init__(self, cache_file: Optional[str] = 'library_cache.json'):
         self.results = {}  # {original: (suggested, file_ext)}
-        self.llm_cache = {}  # {(original, file_ext): is_library_related}
+        self.library_related = {}  # {(original, file_ext): is_library_related}
+        self.replacement_counts = {}  # {relative path: replacements made} from the last replace_with_snake_case
+        self.cache_file = cache_file
+        # LLM answers kept across runs, or only in memory without a cache_file:
+        # {"language:imports digest:identifier": is_library_related}
+        self.llm_cache = self.load_cache()
         self.patterns = {
             '.py': [
                 (re.compile(r'\bclass\s+([a-zA-Z_][a-zA-Z0-9_]*)\b'), 'class'),
@@ -58,66 +106,160 @@ class CamelCaseFinder:
                 content = f.read()
         except Exception:
             return set()
+        return self.imports_in(content, os.path.splitext(file_path)[1].lower())
 
-        ext = os.path.splitext(file_path)[1].lower()
+    def imports_in(self, content, ext):
+        """Collect the modules and names imported by source text in language ext."""
         imports = set()
 
         if ext == '.py':
-            import_pattern = re.compile(r'^\s*import\s+([\w\.]+)(?:\s+as\s+\w+)?', re.MULTILINE)
-            from_import_pattern = re.compile(r'^\s*from\s+([\w\.]+)\s+import\s+([\w,\s*]+)', re.MULTILINE)
-            for match in import_pattern.finditer(content):
+            for match in PY_IMPORT.finditer(content):
                 imports.add(match.group(1))
-            for match in from_import_pattern.finditer(content):
+            for match in PY_FROM_IMPORT.finditer(content):
                 module = match.group(1)
                 imported_items = match.group(2).replace(' ', '').split(',')
                 imports.add(module)
                 imports.update(item for item in imported_items if item != '*')
         elif ext in ('.js', '.ts', '.svelte'):
-            import_pattern = re.compile(r'^\s*import\s+.*\s+from\s+[\'"]([^\'"]+)[\'"]', re.MULTILINE)
-            for match in import_pattern.finditer(content):
+            for match in JS_IMPORT.finditer(content):
                 imports.add(match.group(1))
 
         return imports
 
-    def batch_is_library_related(self, identifiers, imports, file_ext, model):
-        if not imports or not identifiers:
-            return {ident: False for ident in identifiers}
-
-        language = {
-            '.py': 'Python',
-            '.js': 'JavaScript',
-            '.ts': 'TypeScript',
-            '.svelte': 'Svelte/JavaScript',
-        }.get(file_ext, 'Unknown')
-
+    def load_cache(self):
+        """Load the cache file if it exists."""
+        try:
+            if self.cache_file and os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading cache: {e}")
+        return {}
+
+    def save_cache(self):
+        """Save the current cache to file."""
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.llm_cache, f, indent=2)
+        except IOError as e:
+            print(f"Error saving cache: {e}")
+
+    def cache_key(self, identifier, file_ext, imports):
+        """Key an answer by language, import set and identifier; the import set is hashed to keep keys short."""
+        digest = hashlib.blake2b('\n'.join(sorted(imports)).encode('utf-8'), digest_size=8).hexdigest()
+        return f"{LANGUAGES.get(file_ext, 'Unknown')}:{digest}:{identifier}"
+
+    def classify_identifiers(self, contexts, model):
+        """Decide which identifiers belong to imported packages, asking the LLM only about unseen ones.
+
+        contexts maps (file_ext, imports) to the identifiers found in files with
+        that import set. Each distinct question is asked once per scan, and
+        questions from many contexts share a prompt. Returns {cache_key: bool}.
+        """
+        answers = {}
+        pending = []
+        for (file_ext, imports), identifiers in contexts.items():
+            unseen = []
+            for ident in sorted(identifiers):
+                key = self.cache_key(ident, file_ext, imports)
+                if key in self.llm_cache:
+                    answers[key] = self.llm_cache[key]
+                elif not imports and file_ext != '.py':
+                    # Nothing imported and no standard library to draw from
+                    answers[key] = False
+                else:
+                    unseen.append(ident)
+            if unseen:
+                pending.append((file_ext, imports, unseen))
+
+        for batch in self._pack_prompts(pending):
+            answers.update(self._ask_library_related(batch, model))
+            self.save_cache()
+        return answers
+
+    def _pack_prompts(self, pending):
+        """Split (file_ext, imports, identifiers) groups into prompt-sized batches.
+
+        A batch holds about PROMPT_BUDGET_CHARS of import lists and identifiers
+        and at most PROMPT_MAX_IDENTIFIERS identifiers, so the answer stays short
+        enough for one response.
+        """
+        batch, size, count = [], 0, 0
+        for file_ext, imports, identifiers in pending:
+            header = len(', '.join(imports)) + 40
+            start = 0
+            while start < len(identifiers):
+                if batch and (size + header >= PROMPT_BUDGET_CHARS or count >= PROMPT_MAX_IDENTIFIERS):
+                    yield batch
+                    batch, size, count = [], 0, 0
+                size += header
+                end = start
+                # Always take a few identifiers, even when a long import list alone fills the budget
+                while end < len(identifiers) and count < PROMPT_MAX_IDENTIFIERS and (
+                        end - start < 20 or size + len(identifiers[end]) + 2 <= PROMPT_BUDGET_CHARS):
+                    size += len(identifiers[end]) + 2
+                    count += 1
+                    end += 1
+                batch.append((file_ext, imports, identifiers[start:end]))
+                start = end
+        if batch:
+            yield batch
+
+    def _ask_library_related(self, batch, model):
+        """Ask one prompt about every group in batch and cache the answers it parses."""
+        groups = []
+        for number, (file_ext, imports, identifiers) in enumerate(batch, 1):
+            language = LANGUAGES.get(file_ext, 'Unknown')
+            groups.append(
+                f"Group {number} ({language}) imports: {', '.join(sorted(imports)) or 'none'}\n"
+                f"Identifiers: {', '.join(identifiers)}"
+            )
         prompt = (
-            f"For each identifier below, determine if it is a class, function, or variable defined by the "
-            f"following imported {language} packages/modules: {', '.join(imports)} or the {language} standard library.\n"
-            f"Provide answers as a JSON object where keys are identifiers and values are 'Yes' or 'No'.\n\n"
-            f"Identifiers: {', '.join(identifiers)}"
+            "For each group below, determine for every identifier whether it is a class, function, or variable "
+            "defined by the group's imported packages/modules or by the standard library of its language.\n"
+            "Provide answers as a JSON object where keys are group numbers and values are objects whose keys are "
+            "identifiers and values are 'Yes' or 'No'.\n\n" + "\n\n".join(groups)
         )
-        response = llm_interface(prompt, model, 0.7, 0.9, 512)
+        total = sum(len(identifiers) for _, _, identifiers in batch)
+        response = llm_interface(prompt, model, 0.7, 0.9, 64 + 12 * total)
+
+        answers = {}
         try:
-            results = json.loads(response)
-            return {ident: results.get(ident, 'No').lower() == 'yes' for ident in identifiers}
+            results = json.loads(response[response.find('{'):response.rfind('}') + 1])
         except Exception:
-            return {ident: False for ident in identifiers}
+            results = None
+        for number, (file_ext, imports, identifiers) in enumerate(batch, 1):
+            group = results.get(str(number)) if isinstance(results, dict) else None
+            for ident in identifiers:
+                key = self.cache_key(ident, file_ext, imports)
+                if isinstance(group, dict) and ident in group:
+                    answers[key] = self.llm_cache[key] = str(group[ident]).lower() in ('yes', 'true')
+                else:
+                    # Unanswered: treat as project code for now and ask again next scan
+                    answers[key] = False
+        return answers
 
     def find_non_snake_case(self, args):
         file_path, model = args
+        return self.scan_file(file_path)[0]
+
+    def scan_file(self, file_path):
+        """Return a file's non-snake_case declarations and, when there are any, its imports, from one read."""
         ext = os.path.splitext(file_path)[1].lower()
         file_patterns = self.patterns.get(ext, [])
         if not file_patterns:
-            return []
+            return [], frozenset()
 
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+                content = f.read()
         except Exception:
-            return []
+            return [], frozenset()
 
         non_snake_cases = []
-        for i, line in enumerate(lines, 1):
+        for i, line in enumerate(io.StringIO(content), 1):
             for pattern, decl_type in file_patterns:
                 for match in pattern.finditer(line):
                     name = match.group(1)
@@ -128,7 +270,9 @@ class CamelCaseFinder:
                         if suggested != name:
                             non_snake_cases.append((name, suggested, i, ext))
 
-        return non_snake_cases
+        # Imports only matter for files with hits; they key the library questions asked about them
+        imports = frozenset(self.imports_in(content, ext)) if non_snake_cases else frozenset()
+        return non_snake_cases, imports
 
     def scan_directory(self, repo_path: str, extensions: list, model: str, progress=None):
         """Scan the repository with Gradio progress updates."""
@@ -139,8 +283,9 @@ class CamelCaseFinder:
         extensions = {ext if ext.startswith('.') else f'.{ext}' for ext in extensions}
         output = ["Scanning for non-snake_case identifiers (classes and library names excluded)..."]
         self.results = {}
+        self.library_related = {}
 
-        files_to_process = [f for f in repo.rglob('*') if f.is_file() and f.suffix.lower() in extensions]
+        files_to_process = [repo / entry.rel_path for entry in list_files(repo, extensions)]
         if not files_to_process:
             output.append("No matching files found.")
             return "\n".join(output)
@@ -150,40 +295,42 @@ class CamelCaseFinder:
         if progress is not None:
             progress((0, total_files), desc="Starting scan...", total=total_files)
 
-        with Pool(cpu_count()) as pool:
-            file_results = pool.imap_unordered(self.find_non_snake_case, [(str(f), model) for f in files_to_process])
+        # Workers build their own finder once; tasks carry only a path and results come back keyed by it,
+        # with the file's imports parsed from the same read
+        with Pool(cpu_count(), initializer=_init_scan_worker) as pool:
+            file_results = pool.imap(_scan_in_worker, [str(f) for f in files_to_process], chunksize=32)
 
             all_non_snake = {}
-            imports_cache = {}
+            imports_by_file = {}
+            contexts = {}
             processed_files = 0
 
-            for file_result, file_path in zip(file_results, files_to_process):
+            for file_path, file_result, imports in file_results:
+                file_path = Path(file_path)
                 processed_files += 1
                 if progress is not None:
                     progress((processed_files, total_files), desc=f"Scanned {processed_files}/{total_files} files", total=total_files)
 
                 if not file_result:
                     continue
-                relative_path = str(file_path.relative_to(repo))
                 ext = file_path.suffix.lower()
-                imports = imports_cache.setdefault(file_path, self.extract_imports(file_path))
-                if ext == '.py':
-                    imports.update(getattr(sys, 'stdlib_module_names', set()))
+                imports_by_file[file_path] = imports
+                identifiers = contexts.setdefault((ext, imports), set())
 
-                for original, suggested, line_num in file_result:
+                for original, suggested, line_num, _ in file_result:
                     if original not in self.results:
                         self.results[original] = (suggested, ext)
                     all_non_snake.setdefault(file_path, []).append((original, suggested, line_num))
+                    identifiers.add(original)
 
+        # One deduplicated round of LLM questions for the whole scan
+        answers = self.classify_identifiers(contexts, model)
         for file_path, cases in all_non_snake.items():
             ext = file_path.suffix.lower()
-            identifiers = [original for original, _, _ in cases]
-            imports = imports_cache[file_path]
-            batch_results = self.batch_is_library_related(identifiers, imports, ext, model)
+            imports = imports_by_file[file_path]
             for original, suggested, line_num in cases:
-                cache_key = (original, ext)
-                is_related = batch_results.get(original, False)
-                self.llm_cache[cache_key] = is_related
+                is_related = answers.get(self.cache_key(original, ext, imports), False)
+                self.library_related[(original, ext)] = is_related
                 if not is_related:
                     output.append(f"{file_path.relative_to(repo)}: Line {line_num} - {original} -> {suggested} (Package: {is_related})")
 
@@ -210,7 +357,7 @@ class CamelCaseFinder:
             with output_file.open('w', encoding='utf-8') as f:
                 f.write("File Type,Original Name,Suggested Snake Case,Package Related\n")
                 for original, (suggested, file_ext) in self.results.items():
-                    is_pkg = self.llm_cache.get((original, file_ext), "Unknown")
+                    is_pkg = self.library_related.get((original, file_ext), "Unknown")
                     f.write(f"{file_ext},{original},{suggested},{is_pkg}\n")
             return f"Results exported to {output_file}"
         except Exception as e:
@@ -222,7 +369,7 @@ class CamelCaseFinder:
             return f"Error: '{export_file}' is not a valid file."
 
         self.results = {}
-        self.llm_cache = {}
+        self.library_related = {}
         try:
             with export_path.open('r', encoding='utf-8') as f:
                 lines = f.readlines()
@@ -234,12 +381,19 @@ class CamelCaseFinder:
                         continue
                     file_ext, original, suggested, is_pkg = parts
                     self.results[original] = (suggested, file_ext)
-                    self.llm_cache[(original, file_ext)] = is_pkg == 'True'
+                    self.library_related[(original, file_ext)] = is_pkg == 'True'
             return f"Loaded results from {export_file}. {len(self.results)} identifiers ready for replacement."
         except Exception as e:
             return f"Error loading results: {str(e)}"
 
-    def replace_with_snake_case(self, repo_path: str, extensions: list = None):
+    def replace_with_snake_case(self, repo_path: str, extensions: list = None, workers: int = 1):
+        """Rename the found identifiers in every file that uses them.
+
+        Files are read and checked against one combined pattern per extension;
+        only files with a match are rewritten, each through a temp file and an
+        atomic rename. With workers > 1 this runs in a process pool.
+        Per-file counts are kept in self.replacement_counts.
+        """
         if not self.results:
             return "No identifiers to replace. Please scan or load results first."
 
@@ -256,32 +410,82 @@ class CamelCaseFinder:
             return "No identifiers match the specified file extensions."
 
         output = ["Replacing non-snake_case identifiers..."]
-        updated_files = set()
 
-        for file_path in repo.rglob('*'):
-            if not file_path.is_file() or (extensions and file_path.suffix.lower() not in extensions):
-                continue
-            ext = file_path.suffix.lower()
-            try:
-                with file_path.open('r', encoding='utf-8') as f:
-                    content = f.read()
-
-                new_content = content
-                for original, (suggested, file_ext) in filtered_results.items():
-                    if file_ext == ext:
-                        pattern = rf'(?<!\w){re.escape(original)}(?!\w)'
-                        new_content = re.sub(pattern, suggested, new_content)
-
-                if new_content != content:
-                    with file_path.open('w', encoding='utf-8') as f:
-                        f.write(new_content)
-                    updated_files.add(str(file_path.relative_to(repo)))
-            except Exception as e:
-                output.append(f"Error updating {file_path}: {str(e)}")
-
-        if updated_files:
-            output.extend([f"Updated {path}" for path in updated_files])
-        output.append("Replacement complete.")
+        # One combined pattern per extension, so each file is rewritten in a single pass
+        replacements = {}
+        for original, (suggested, file_ext) in filtered_results.items():
+            replacements.setdefault(file_ext, {})[original] = suggested
+        # References can sit in any file of these types, not just where the scan saw a declaration
+        paths = [str(repo / entry.rel_path) for entry in list_files(repo, list(replacements))]
+
+        if workers > 1 and len(paths) > 1:
+            with Pool(min(workers, len(paths)), initializer=_init_rewrite_worker, initargs=(replacements,)) as pool:
+                changes = list(pool.imap_unordered(_rewrite_identifiers, paths, chunksize=16))
+        else:
+            _init_rewrite_worker(replacements)
+            changes = list(map(_rewrite_identifiers, paths))
+
+        self.replacement_counts = {}
+        for file_path, count, error in sorted(changes):
+            relative_path = str(Path(file_path).relative_to(repo))
+            if error:
+                output.append(f"Error updating {file_path}: {error}")
+            elif count:
+                self.replacement_counts[relative_path] = count
+                output.append(f"Updated {relative_path} ({count} replacements)")
+
+        output.append(f"Replacement complete: {sum(self.replacement_counts.values())} replacements "
+                      f"in {len(self.replacement_counts)} file(s).")
         self.results = {}
-        self.llm_cache = {}
+        self.library_related = {}
         return "\n".join(output)
+
+
+# Per-process finder for the scan, set up once by _init_scan_worker instead of being pickled with every task
+_scan_finder = None
+
+
+def _init_scan_worker():
+    global _scan_finder
+    _scan_finder = CamelCaseFinder(cache_file=None)
+
+
+def _scan_in_worker(file_path):
+    return (file_path, *_scan_finder.scan_file(file_path))
+
+
+# Per-process replacement state, set up once by _init_rewrite_worker instead of being pickled with every task
+_rewrite_replacements = {}
+_rewrite_patterns = {}
+
+
+def _init_rewrite_worker(replacements):
+    """Record the {ext: {original: suggested}} map and compile one pattern per extension."""
+    _rewrite_replacements.clear()
+    _rewrite_replacements.update(replacements)
+    _rewrite_patterns.clear()
+    _rewrite_patterns.update((ext, identifier_pattern(names)) for ext, names in replacements.items())
+
+
+def _rewrite_identifiers(file_path):
+    """Replace identifiers in one file, atomically and only if it contains any; return (path, count, error)."""
+    ext = os.path.splitext(file_path)[1].lower()
+    pattern = _rewrite_patterns.get(ext)
+    if pattern is None:
+        return file_path, 0, None
+    try:
+        mtime_ns = os.stat(file_path).st_mtime_ns
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        content = data.decode('utf-8')
+        if not pattern.search(content):
+            return file_path, 0, None
+
+        mapping = _rewrite_replacements[ext]
+        new_content, count = pattern.subn(lambda match: mapping[match.group()], content)
+        new_data = new_content.encode('utf-8')
+        # The fingerprint makes the write fail rather than clobber an edit made since the read above
+        rewrite_file(file_path, lambda read, write: write(new_data), (mtime_ns, fingerprint_digest(data).hexdigest()))
+        return file_path, count, None
+    except Exception as e:
+        return file_path, 0, str(e)
@@ -3,6 +3,8 @@ import os
 import re
 from typing import Dict, Set, Tuple, Optional
 from tqdm import tqdm
+from llm_executor import run_concurrently
+from repo_snapshot import list_files
 
 
 class CodeImprover:
@@ -106,7 +108,10 @@ class CodeImprover:
         """Improve a single code file using LLM processing."""
         from llm_backend import llm_interface  # Assuming this exists
 
-        prompt = self.get_prompt(file_path, options)
+        try:
+            prompt = self.get_prompt(file_path, options)
+        except (OSError, UnicodeDecodeError) as e:
+            return f"Error reading {file_path}: {str(e)}"
         if not prompt:
             return f"Error: Unsupported file type or no improvements selected for {file_path}"
 
@@ -129,8 +134,14 @@ class CodeImprover:
             file.write(code_match.group(1))
         return f"Improved {file_path}"
 
-    def improve_directory(self, repo_path: str, extensions: Set[str], options: Dict[str, bool], model: str) -> str:
-        """Process all matching files in a directory with progress tracking."""
+    def improve_directory(self, repo_path: str, extensions: Set[str], options: Dict[str, bool], model: str,
+                          concurrency: int = None, requests_per_minute: float = None, progress=None) -> str:
+        """Process all matching files in a directory with progress tracking.
+
+        Up to concurrency files are sent to the LLM at once, no faster than
+        requests_per_minute; both default to the llm_executor settings. Results
+        are listed in path order whatever order the requests finish in.
+        """
         if not os.path.isdir(repo_path):
             return "Invalid repository path"
 
@@ -140,16 +151,22 @@ class CodeImprover:
             extensions -= unsupported
             print(f"Warning: Ignoring unsupported extensions: {unsupported}")
 
-        output = ["Improving scripts..."]
-        files_to_process = [
-            os.path.join(root, file)
-            for root, _, files in os.walk(repo_path)
-            for file in files
-            if os.path.splitext(file)[1].lower() in extensions
-        ]
-
-        for file_path in tqdm(files_to_process, desc="Processing files", unit="file"):
-            output.append(self.improve_file(file_path, options, model))
+        files_to_process = [os.path.join(repo_path, entry.rel_path) for entry in list_files(repo_path, extensions)]
+        total_files = len(files_to_process)
+        if total_files == 0:
+            return "No files found matching the selected extensions."
+
+        if progress is not None:
+            progress(0, desc="Starting code improvement...")
+        results = {}
+        improved = run_concurrently(lambda file_path: self.improve_file(file_path, options, model), files_to_process,
+                                    concurrency, requests_per_minute)
+        for file_path, result in tqdm(improved, total=total_files, desc="Processing files", unit="file"):
+            results[file_path] = result
+            if progress is not None:
+                progress(len(results) / total_files, desc=f"Processed {len(results)}/{total_files} files")
 
+        output = ["Improving scripts..."]
+        output.extend(results[file_path] for file_path in files_to_process)
         output.append("Improvement complete.")
         return "\n".join(output)
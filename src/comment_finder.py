@@ -1,78 +1,161 @@
 # comment_finder.py
+import io
 import os
 import re
 from datetime import datetime
+from itertools import accumulate
+from multiprocessing import Pool
+from typing import List, NamedTuple, Optional
+from comment_lexer import lexer_for, read_chunks
+from file_rewriter import FileChangedError, fingerprint_digest, rewrite_file, skip_ranges
+from repo_snapshot import list_files
+
+COMMENT_RUN = re.compile(rb'\x01{2,}')
+# In streaming mode a run may continue into the next chunk, so single flagged lines count too
+FLAGGED_LINES = re.compile(rb'\x01+')
+
+
+class CommentSpan(NamedTuple):
+    """A run of comment lines: 1-based line numbers and the byte range it covers, line endings included.
+
+    Streaming scans leave lines as None and read the text back when needed.
+    """
+    start_line: int
+    end_line: int
+    start_byte: int
+    end_byte: int
+    lines: Optional[List[str]] = None
+
+
+def span_lines(file_path: str, span: CommentSpan):
+    """Read the stripped lines of a CommentSpan back from its file."""
+    with open(file_path, 'rb') as f:
+        f.seek(span.start_byte)
+        data = f.read(span.end_byte - span.start_byte)
+    return [line.strip() for line in io.StringIO(data.decode('utf-8'), newline='')]
 
 
 class CommentFinder:
-    def __init__(self):
-        # Define comment patterns for supported extensions
-        self.comment_patterns = {
-            '.py': r'^\s*#',
-            '.ts': r'^\s*//',
-            '.js': r'^\s*//',
-            '.svelte': r'^\s*//',
-            '.html': r'^\s*<!--',
-            '.css': r'^\s*/\*'
-        }
+    def __init__(self, include_docstrings: bool = False, streaming: bool = False):
+        # Count Python docstrings and bare string statements as comments
+        self.include_docstrings = include_docstrings
+        # Leave the comment text out of the spans and read each file in bounded chunks
+        self.streaming = streaming
         self.results = {}  # Store results for later use
+        # (mtime_ns, digest) of every file in results as it was scanned, checked again before deleting
+        self.fingerprints = {}
 
-    def find_consecutive_comments(self, file_path: str):
-        """Find consecutive comment lines in a file based on its extension."""
-        ext = os.path.splitext(file_path)[1].lower()
+    def find_consecutive_comments(self, file_path: str, digest=None):
+        """Find consecutive comment-only lines in a file with the lexer for its language.
+
+        digest, if given, is updated with the file's bytes as they are read.
+        """
+        if self.streaming:
+            return self.find_comment_spans(file_path, digest)
         comments = []
 
         # Skip if extension not supported
-        if ext not in self.comment_patterns:
+        lexer = lexer_for(file_path, self.include_docstrings)
+        if lexer is None:
             return []
 
-        comment_pattern = self.comment_patterns[ext]
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            text = data.decode('utf-8')
         except Exception:
             return []
+        if digest is not None:
+            digest.update(data)
+        # Nothing after the last comment marker can be flagged, so only the text up to it is lexed.
+        # Line endings are kept so the byte offsets below match the file.
+        lines = io.StringIO(text[:lexer.scan_end(text)], newline='').readlines()
+
+        # Runs of two or more comment-only lines, found on the per-line flags in one regex pass
+        flags = bytearray().join(flags for _, flags in lexer.classify([lines]))
+        runs = [run.span() for run in COMMENT_RUN.finditer(flags)]
+        if runs:
+            sizes = map(len, lines) if data.isascii() else map(len, map(str.encode, lines))
+            starts = list(accumulate(sizes, initial=0))
+            for start, end in runs:
+                comments.append(CommentSpan(start + 1, end, starts[start], starts[end],
+                                            [line.strip() for line in lines[start:end]]))
+
+        return comments
+
+    def find_comment_spans(self, file_path: str, digest=None):
+        """Streaming variant of find_consecutive_comments that returns CommentSpans.
+
+        The file is lexed in chunks of about a megabyte, so memory depends on
+        the number of spans found rather than on the size of the file. digest,
+        if given, is updated with the file's bytes; the lines keep their line
+        endings, so encoding them again gives back exactly what was read.
+        """
+        lexer = lexer_for(file_path, self.include_docstrings)
+        if lexer is None:
+            return []
 
-        consecutive_comments = []
-        start_line = None
+        spans = []
+        # Line index and byte offset where the current chunk starts, and where an unfinished run began
+        line_no, offset, run_start = 0, 0, None
 
-        for i, line in enumerate(lines, 1):
-            if re.match(comment_pattern, line):
-                if not start_line:
-                    start_line = i
-                consecutive_comments.append(line.strip())
-            else:
-                if len(consecutive_comments) > 1:  # Only include if more than one consecutive comment
-                    comments.append((start_line, i - 1, consecutive_comments))
-                consecutive_comments = []
-                start_line = None
+        def close_run(end_line, end_byte):
+            if end_line - run_start[0] > 1:
+                spans.append(CommentSpan(run_start[0] + 1, end_line, run_start[1], end_byte))
 
-        if len(consecutive_comments) > 1:
-            comments.append((start_line, len(lines), consecutive_comments))
+        try:
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                for lines, flags in lexer.classify(read_chunks(f)):
+                    encoded = list(map(str.encode, lines))
+                    if digest is not None:
+                        digest.update(b''.join(encoded))
+                    starts = list(accumulate(map(len, encoded), initial=offset))
+                    if run_start and not flags[:1] == b'\x01':
+                        close_run(line_no, offset)
+                        run_start = None
+                    for run in FLAGGED_LINES.finditer(flags):
+                        start, end = run.span()
+                        if not (start == 0 and run_start):
+                            run_start = (line_no + start, starts[start])
+                        if end < len(lines):
+                            close_run(line_no + end, starts[end])
+                            run_start = None
+                    line_no, offset = line_no + len(lines), starts[-1]
+        except Exception:
+            return []
+        if run_start:
+            close_run(line_no, offset)
+        return spans
 
-        return comments
+    def scan_directory(self, repo_path: str, extensions: list, include_docstrings: bool = None, workers: int = 1,
+                       streaming: bool = None):
+        """Scan the repository for files with consecutive comments.
 
-    def scan_directory(self, repo_path: str, extensions: list):
-        """Scan the repository for files with consecutive comments."""
+        With workers > 1, files are lexed in a process pool; results are still
+        merged in the repository's sorted path order.
+        """
         if not repo_path or not os.path.isdir(repo_path):
             return "Please enter a valid repository folder path"
+        if include_docstrings is not None:
+            self.include_docstrings = include_docstrings
+        if streaming is not None:
+            self.streaming = streaming
 
         # Normalize extensions
         extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in extensions]
         output = ["Scanning for consecutive comments..."]
         self.results = {}
-
-        for root, _, files in os.walk(repo_path):
-            for file in files:
-                file_ext = os.path.splitext(file)[1].lower()
-                if file_ext in extensions:
-                    file_path = os.path.join(root, file)
-                    comments = self.find_consecutive_comments(file_path)
-                    if comments:
-                        self.results[file_path] = comments
-                        relative_path = os.path.relpath(file_path, repo_path)
-                        for start_line, end_line, _ in comments:
-                            output.append(f"{relative_path}: Lines {start_line}-{end_line}")
+        self.fingerprints = {}
+
+        entries = list_files(repo_path, extensions)
+        paths = [os.path.join(repo_path, entry.rel_path) for entry in entries]
+        if workers > 1 and len(paths) > 1:
+            with Pool(min(workers, len(paths)), initializer=_init_worker,
+                      initargs=(self.include_docstrings, self.streaming)) as pool:
+                # imap keeps input order, so the merge below is deterministic
+                self._collect(entries, paths, pool.imap(_scan_in_worker, paths, chunksize=32), output)
+        else:
+            self._collect(entries, paths, map(self._scan_file, paths), output)
 
         if not self.results:
             output.append("No consecutive comments found.")
@@ -81,6 +164,26 @@ class CommentFinder:
 
         return "\n".join(output)
 
+    def _scan_file(self, file_path: str):
+        """Return a file's comment spans plus the fingerprint delete_comments checks before editing it."""
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+            # Fed by the scan's own read of the file, so it is not read a second time
+            digest = fingerprint_digest()
+            comments = self.find_consecutive_comments(file_path, digest)
+            return comments, (mtime_ns, digest.hexdigest()) if comments else None
+        except OSError:
+            return [], None
+
+    def _collect(self, entries, paths, found, output):
+        """Merge per-file results into self.results in path order."""
+        for entry, file_path, (comments, fingerprint) in zip(entries, paths, found):
+            if comments:
+                self.results[file_path] = comments
+                self.fingerprints[file_path] = fingerprint
+                for start_line, end_line, *_ in comments:
+                    output.append(f"{entry.rel_path}: Lines {start_line}-{end_line}")
+
     def export_results(self, repo_path: str):
         """Export the results to a file in the repository path."""
         if not self.results:
@@ -97,8 +200,10 @@ class CommentFinder:
                 for file_path, comments in self.results.items():
                     relative_path = os.path.relpath(file_path, repo_path)
                     f.write(f"\n{relative_path}:\n")
-                    for start_line, end_line, content in comments:
-                        f.write(f"  Lines {start_line}-{end_line}:\n")
+                    for span in comments:
+                        # Streaming scans kept only positions; load the text now
+                        content = span.lines if span.lines is not None else span_lines(file_path, span)
+                        f.write(f"  Lines {span.start_line}-{span.end_line}:\n")
                         for line in content:
                             f.write(f"    {line}\n")
             return f"Results exported to {output_file}"
@@ -106,7 +211,11 @@ class CommentFinder:
             return f"Error exporting results: {str(e)}"
 
     def delete_comments(self, repo_path: str):
-        """Delete consecutive comments from files, processing from last to first."""
+        """Delete the scanned comment runs, rewriting each file atomically in one forward pass.
+
+        Files whose mtime or content hash changed since the scan are left
+        untouched and reported, since their recorded spans no longer apply.
+        """
         if not self.results:
             return "No comments to delete. Please scan first."
 
@@ -115,29 +224,31 @@ class CommentFinder:
 
         output = ["Deleting consecutive comments..."]
         for file_path, comments in self.results.items():
+            relative_path = os.path.relpath(file_path, repo_path)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-
-                # Sort comments by start_line in reverse order to avoid shifting
-                comments_sorted = sorted(comments, key=lambda x: x[0], reverse=True)
-
-                for start_line, end_line, _ in comments_sorted:
-                    # Adjust for 0-based indexing
-                    start_idx = start_line - 1
-                    end_idx = end_line
-                    del lines[start_idx:end_idx]
-
-                # Write updated content back to file
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.writelines(lines)
-
-                relative_path = os.path.relpath(file_path, repo_path)
+                ranges = sorted((span.start_byte, span.end_byte) for span in comments)
+                rewrite_file(file_path, skip_ranges(ranges), self.fingerprints.get(file_path))
                 output.append(f"Deleted comments from {relative_path}")
+            except FileChangedError:
+                output.append(f"Skipped {relative_path}: modified since the scan, please scan again")
             except Exception as e:
                 output.append(f"Error deleting comments in {file_path}: {str(e)}")
 
         # Clear results after deletion
         self.results = {}
+        self.fingerprints = {}
         output.append("Deletion complete.")
         return "\n".join(output)
+
+
+# Per-process finder, set up once by _init_worker instead of being pickled with every task
+_worker_finder = None
+
+
+def _init_worker(include_docstrings, streaming):
+    global _worker_finder
+    _worker_finder = CommentFinder(include_docstrings, streaming)
+
+
+def _scan_in_worker(file_path):
+    return _worker_finder._scan_file(file_path)
@@ -0,0 +1,451 @@
+# comment_lexer.py
+import os
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+# Characters of whole lines read per chunk when a file is streamed
+CHUNK_CHARS = 1 << 20
+# Line comments Lexer.scan_end rules out before it settles for a looser bound
+SCAN_END_PROBES = 16
+
+# Characters and keywords after which a '/' in JS/TS starts a regex literal rather than a division
+REGEX_PRECEDERS = frozenset('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = frozenset({
+    'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw',
+    'instanceof', 'yield', 'await',
+})
+WORD_TAIL = re.compile(r'[\w$]+$')
+
+# Single-line strings, unrolled so the regex engine does not branch per character
+DQ_STRING = r'"[^"\\\r\n]*(?:\\[\s\S][^"\\\r\n]*)*"?'
+SQ_STRING = r"'[^'\\\r\n]*(?:\\[\s\S][^'\\\r\n]*)*'?"
+
+# Template literal whose substitutions hold no braces, quotes, slashes or backticks, so nothing in it can be a comment
+C_SIMPLE_TEMPLATE = r'`[^`\\$]*(?:(?:\\[\s\S]|\$(?!\{)|\$\{[^{}`\'"/\\]*\})[^`\\$]*)*`'
+# Plain code, strings and simple templates are consumed inside the regex. Wrapping them in a
+# lookahead plus backreference makes that prefix atomic, so the engine never rescans it.
+# A '/' right after a name, ')' or ']' (and at most one space) that _regex_can_start would call a division
+C_DIVISION = (r'(?:(?<=[\w$)\]])|(?<=[\w$)\]][ \t]))'
+              + ''.join(rf'(?<![^\w$]{word})(?<!^{word})(?<![^\w$]{word}[ \t])(?<!^{word}[ \t])'
+                        for word in sorted(REGEX_KEYWORDS))
+              + r'/(?![/*])')
+_C_SKIP = (r'(?=(?P<skip>(?:[^/"\'`%s]+|' + DQ_STRING + '|' + SQ_STRING + '|' + C_SIMPLE_TEMPLATE + '|' + C_DIVISION
+           + r')*))(?P=skip)')
+# Consecutive // lines come back as one token
+_C_TOKENS = r'''
+    (?P<line>//[^\r\n]*(?:(?:\r\n?|\n)[ \t]*//[^\r\n]*)*)
+  | (?P<block>/\*[\s\S]*?(?:\*/|\Z))
+  | (?P<template>`)
+  | (?P<slash>/)
+'''
+C_CODE = re.compile(_C_SKIP % '' + '(?:' + _C_TOKENS + r'| \Z)', re.VERBOSE)
+# Inside a ${...} substitution braces are counted to find the '}' that resumes the template
+C_SUBSTITUTION = re.compile(_C_SKIP % '{}' + '(?:' + _C_TOKENS + r'| (?P<open>\{) | (?P<close>\}) | \Z)',
+                            re.VERBOSE)
+C_TEMPLATE_BODY = re.compile(r'(?:[^`\\$]|\\[\s\S]|\$(?!\{))*(`|\$\{)?')
+C_REGEX_BODY = re.compile(r'(?:\\.|\[(?:\\.|[^\]\\\r\n])*\]|[^/\\\[\r\n])*/')
+
+CSS_CODE = re.compile(rf'''(?=[/"'])(?:
+    (?P<block>/\*[\s\S]*?(?:\*/|\Z))
+  | {DQ_STRING} | {SQ_STRING}
+)''', re.VERBOSE)
+
+PY_DQ_TRIPLE = r'"""[^"\\]*(?:(?:\\[\s\S]|"(?!""))[^"\\]*)*'
+PY_SQ_TRIPLE = r"'''[^'\\]*(?:(?:\\[\s\S]|'(?!''))[^'\\]*)*"
+# Single-quoted strings, never the opening quotes of a triple-quoted one
+_PY_SHORT_STRINGS = r'(?!""")(?!\'\'\')(?:' + DQ_STRING + '|' + SQ_STRING + ')'
+# Consecutive # lines come back as one token
+_PY_TOKENS = r'''
+    (?P<comment>\#[^\r\n]*(?:(?:\r\n?|\n)[ \t]*\#[^\r\n]*)*)
+  | (?P<triple>''' + PY_DQ_TRIPLE + '(?P<dq>""")?|' + PY_SQ_TRIPLE + "(?P<sq>''')?)"
+# Without docstrings, closed triple-quoted strings are skipped with the rest of the code
+PY_CODE = re.compile(
+    r'(?=(?P<skip>(?:[^#"\']+|' + PY_DQ_TRIPLE + '"""|' + PY_SQ_TRIPLE + "'''|" + _PY_SHORT_STRINGS + r')*))(?P=skip)'
+    '(?:' + _PY_TOKENS + r'| \Z)', re.VERBOSE)
+# Docstring detection needs every triple-quoted string and the bracket depth
+PY_STATEMENTS = re.compile(
+    r'(?=(?P<skip>(?:[^#"\'()\[\]{}]+|' + _PY_SHORT_STRINGS + r')*))(?P=skip)'
+    '(?:' + _PY_TOKENS + r'| (?P<open>[(\[{]) | (?P<close>[)\]}]) | \Z)', re.VERBOSE)
+STRING_PREFIXES = frozenset({'', 'r', 'u', 'b', 'f', 'rb', 'br', 'rf', 'fr'})
+PY_STATEMENT_END = re.compile(r'[ \t]*(?:#[^\r\n]*)?(?:\r\n?|\n|\Z)')
+# Blank and comment lines, then the indentation of the next statement
+PY_NEXT_STATEMENT = re.compile(r'(?:[ \t]*(?:#[^\r\n]*)?(?:\r\n?|\n))*(?P<indent>[ \t]*)(?P<eof>\Z)?')
+# Openers of spans that hold consecutive line comments rather than one block comment
+LINE_COMMENTS = ('//', '#')
+LEADING_SPACE = re.compile(r'[ \t]*')
+LINE_END = re.compile(r'[^\r\n]*(?:\r\n?|\n)?')
+
+HTML_MARKUP = re.compile(r'(?P<comment><!--[\s\S]*?(?:-->|\Z))|<(?P<tag>script|style)\b[^>]*>', re.IGNORECASE)
+
+
+class Lexer:
+    """Base of the comment lexers.
+
+    lex() tokenizes a chunk of whole lines with one regex pass and returns
+    the (start, end) offsets of its comments. Chunks are only committed where
+    no string or comment is left open, so the state carried between chunks
+    stays small and a file is classified in one forward pass.
+    """
+
+    # Markers that start a comment-only line when nothing but whitespace precedes them
+    LINE_OPENERS = ()
+    # (open, close) markers of comments that may also continue onto other lines
+    BLOCK_MARKERS = ()
+
+    def __init__(self):
+        # Set by lex() when the chunk ended inside a multi-line string, template or comment
+        self.open = False
+
+    def lex(self, text):
+        raise NotImplementedError
+
+    def scan_end(self, text):
+        """Return an offset in text past which no line can be comment-only, or 0 if no line can be.
+
+        Only the comment markers are searched, from the end of the text, so
+        the lexer can stop early on code whose last comment is near the top,
+        such as minified bundles. String context is ignored, which can only
+        make the bound larger than needed.
+        """
+        last = -1
+        # Ruling out line comments one by one stops paying off after a few
+        probes = SCAN_END_PROBES
+        for marker in self.LINE_OPENERS:
+            pos = text.rfind(marker)
+            while pos > last:
+                if _starts_line(text, pos):
+                    if not probes or self._follows_comment(text, pos):
+                        break
+                    probes -= 1
+                pos = text.rfind(marker, 0, pos + len(marker) - 1)
+            last = max(last, pos)
+        for opener, closer in self.BLOCK_MARKERS:
+            # A later block also ends later, so the last one that may hold a comment-only line decides
+            pos = text.rfind(opener)
+            while pos >= 0:
+                close = text.find(closer, pos + len(opener))
+                close = len(text) if close < 0 else close + len(closer)
+                if (_starts_line(text, pos)
+                        or text.find('\n', pos, close) >= 0 or text.find('\r', pos, close) >= 0):
+                    last = max(last, close - 1)
+                    break
+                pos = text.rfind(opener, 0, pos + len(opener) - 1)
+        return LINE_END.match(text, last).end() if last >= 0 else 0
+
+    def _follows_comment(self, text, pos):
+        """Tell whether the line before the one at pos could hold nothing but comments.
+
+        A line comment past the last block comment can only be part of a run
+        with the line before it, so one on its own does not extend the bound.
+        """
+        line_end = max(text.rfind('\n', 0, pos), text.rfind('\r', 0, pos))
+        if line_end < 0:
+            return False
+        if text.startswith('\r\n', line_end - 1):
+            line_end -= 1
+        line_start = max(text.rfind('\n', 0, line_end), text.rfind('\r', 0, line_end)) + 1
+        openers = self.LINE_OPENERS + tuple(opener for opener, _ in self.BLOCK_MARKERS)
+        if text.startswith(openers, LEADING_SPACE.match(text, line_start).end()):
+            return True
+        return any(text.find(closer, line_start, line_end) >= 0 for _, closer in self.BLOCK_MARKERS)
+
+    def classify(self, chunks):
+        """Yield (lines, flags) for a file given as chunks of whole lines.
+
+        flags is a bytearray holding 1 for each line with nothing but comment
+        text. Input chunks are merged while a string or comment stays open
+        across them, so every yielded block can be classified on its own.
+        """
+        pending, needed = [], 0
+        # Nested region lexers reset their own state on every lex(), so a shallow copy is enough
+        state = dict(self.__dict__)
+        for chunk in chunks:
+            pending += chunk
+            if len(pending) < needed:
+                continue
+            text = ''.join(pending)
+            spans = self.lex(text)
+            if self.open:
+                # Lex again from the last clean point once twice as many lines are in hand
+                self.__dict__ = dict(state)
+                needed = 2 * len(pending)
+                continue
+            yield pending, comment_only(pending, text, spans)
+            pending, needed = [], 0
+            state = dict(self.__dict__)
+        if pending:
+            text = ''.join(pending)
+            yield pending, comment_only(pending, text, self.lex(text))
+
+
+class CLikeLexer(Lexer):
+    """JS/TS: // and /* */ comments, quoted strings, template literals with ${} and regex literals."""
+
+    LINE_OPENERS = ('//',)
+    BLOCK_MARKERS = (('/*', '*/'),)
+
+    def _regex_can_start(self, text, pos):
+        i = pos - 1
+        while i >= 0 and text[i] in ' \t\r\n':
+            i -= 1
+        if i < 0 or text[i] in REGEX_PRECEDERS:
+            return True
+        match = WORD_TAIL.search(text, max(0, i - 15), i + 1)
+        return bool(match) and match.group() in REGEX_KEYWORDS
+
+    def lex(self, text):
+        spans = []
+        # Brace depth of every ${...} substitution we are inside, innermost last
+        substitutions = []
+        self.open = False
+        pos, resume = 0, True
+        while resume:
+            resume = False
+            for match in (C_SUBSTITUTION if substitutions else C_CODE).finditer(text, pos):
+                # 'skip' when only code and strings were left before the end of the text
+                kind = match.lastgroup
+                if kind == 'line':
+                    spans.append(match.span(kind))
+                elif kind == 'block':
+                    start, end = match.span(kind)
+                    spans.append((start, end))
+                    if end - start < 4 or not text.startswith('*/', end - 2):
+                        self.open = True
+                elif kind == 'slash':
+                    body = self._regex_can_start(text, match.start(kind)) and C_REGEX_BODY.match(text, match.end())
+                    if body:
+                        # Skip the regex literal so quotes and slashes inside it are not taken as tokens
+                        pos, resume = body.end(), True
+                        break
+                elif kind == 'open':
+                    substitutions[-1] += 1
+                elif kind == 'close' and substitutions[-1]:
+                    substitutions[-1] -= 1
+                elif kind in ('template', 'close'):
+                    if kind == 'close':
+                        substitutions.pop()
+                    body = C_TEMPLATE_BODY.match(text, match.end())
+                    if body.group(1) == '${':
+                        substitutions.append(0)
+                    elif body.group(1) is None:
+                        self.open = True
+                        return spans
+                    pos, resume = body.end(), True
+                    break
+        if substitutions:
+            self.open = True
+        return spans
+
+
+class CssLexer(Lexer):
+    """CSS: /* */ comments and quoted strings."""
+
+    BLOCK_MARKERS = (('/*', '*/'),)
+
+    def lex(self, text):
+        spans = []
+        self.open = False
+        for match in CSS_CODE.finditer(text):
+            if match.lastgroup == 'block':
+                spans.append(match.span())
+                if match.end() - match.start() < 4 or not text.startswith('*/', match.end() - 2):
+                    self.open = True
+        return spans
+
+
+class PythonLexer(Lexer):
+    """Python: # comments and strings, optionally with docstrings counted as comments.
+
+    A docstring here is any triple-quoted string that makes up a whole
+    statement, which covers module, class and function docstrings as well as
+    bare strings used as block comments.
+    """
+
+    LINE_OPENERS = ('#',)
+
+    def __init__(self, include_docstrings=False):
+        super().__init__()
+        self.include_docstrings = include_docstrings
+        # Bracket depth and backslash continuation carried over from the previous chunk
+        self.depth = 0
+        self.continued = False
+
+    def lex(self, text):
+        spans = []
+        self.open = False
+        for match in (PY_STATEMENTS if self.include_docstrings else PY_CODE).finditer(text):
+            kind = match.lastgroup
+            if kind == 'comment':
+                spans.append(match.span(kind))
+            elif kind in ('triple', 'dq', 'sq'):
+                if not (match.group('dq') or match.group('sq')):
+                    self.open = True
+                    break
+                if self.include_docstrings and self.depth == 0:
+                    start = self._statement_start(text, match.start('triple'), match.end())
+                    if start is not None:
+                        spans.append((start, match.end()))
+            elif kind == 'open':
+                self.depth += 1
+            elif kind == 'close' and self.depth:
+                self.depth -= 1
+        self.continued = text.rstrip('\r\n').endswith('\\')
+        return spans
+
+    def scan_end(self, text):
+        """Return the bound of Lexer.scan_end; with docstrings any triple-quoted string means the whole text."""
+        if self.include_docstrings and ('"""' in text or "'''" in text):
+            return len(text)
+        return super().scan_end(text)
+
+    def _statement_start(self, text, start, end):
+        """Return where the string at start:end begins if it can go like a docstring, else None.
+
+        The string has to stand alone on its lines, and inside a suite another
+        statement has to follow it, so removing it never leaves the suite empty.
+        """
+        line_start = max(text.rfind('\n', 0, start), text.rfind('\r', 0, start)) + 1
+        prefix = text[line_start:start].lstrip()
+        if prefix.lower() not in STRING_PREFIXES:
+            return None
+        if line_start == 0:
+            if self.continued:
+                return None
+        elif text[max(0, line_start - 3):line_start].rstrip('\r\n').endswith('\\'):
+            return None
+        statement_end = PY_STATEMENT_END.match(text, end)
+        if not statement_end:
+            return None
+        indent = text[line_start:start - len(prefix)]
+        if indent:
+            following = PY_NEXT_STATEMENT.match(text, statement_end.end())
+            if following.group('eof') is not None:
+                # The next statement may be in the next chunk; at the end of the file the suite ends here
+                self.open = True
+                return None
+            if len(following.group('indent').expandtabs()) < len(indent.expandtabs()):
+                return None
+        return start - len(prefix)
+
+
+class HtmlLexer(Lexer):
+    """HTML and Svelte: <!-- --> comments, with <script> and <style> regions handed to the JS and CSS lexers."""
+
+    LINE_OPENERS = ('//',)
+    BLOCK_MARKERS = (('/*', '*/'), ('<!--', '-->'))
+
+    def __init__(self):
+        super().__init__()
+        # Lexer and closing-tag pattern of a <script>/<style> region continuing from the previous chunk
+        self.region = None
+        self.region_end = None
+
+    def _lex_region(self, text, pos, spans):
+        close = self.region_end.search(text, pos)
+        body_end = close.start() if close else len(text)
+        spans.extend((start + pos, end + pos) for start, end in self.region.lex(text[pos:body_end]))
+        if self.region.open:
+            self.open = True
+        if close:
+            self.region = self.region_end = None
+            return close.end()
+        return len(text)
+
+    def lex(self, text):
+        spans = []
+        self.open = False
+        pos = 0
+        if self.region is not None:
+            pos = self._lex_region(text, pos, spans)
+        while not self.open:
+            match = HTML_MARKUP.search(text, pos)
+            if not match:
+                break
+            pos = match.end()
+            if match.lastgroup == 'comment':
+                spans.append(match.span())
+                if match.end() - match.start() < 7 or not text.startswith('-->', match.end() - 3):
+                    self.open = True
+                continue
+            tag = match.group('tag').lower()
+            self.region = CLikeLexer() if tag == 'script' else CssLexer()
+            self.region_end = re.compile(rf'</{tag}\s*>', re.IGNORECASE)
+            pos = self._lex_region(text, pos, spans)
+        return spans
+
+
+LEXERS = {
+    '.py': PythonLexer,
+    '.ts': CLikeLexer,
+    '.tsx': CLikeLexer,
+    '.js': CLikeLexer,
+    '.jsx': CLikeLexer,
+    '.mjs': CLikeLexer,
+    '.cjs': CLikeLexer,
+    '.css': CssLexer,
+    '.html': HtmlLexer,
+    '.htm': HtmlLexer,
+    '.svelte': HtmlLexer,
+}
+
+
+def lexer_for(file_path, include_docstrings=False):
+    """Return a fresh lexer for the file's extension, or None if the language is not supported."""
+    lexer_class = LEXERS.get(os.path.splitext(file_path)[1].lower())
+    if lexer_class is None:
+        return None
+    return lexer_class(include_docstrings) if lexer_class is PythonLexer else lexer_class()
+
+
+def _starts_line(text, pos):
+    """Tell whether only spaces and tabs precede pos on its line."""
+    pos -= 1
+    while pos >= 0 and text[pos] in ' \t':
+        pos -= 1
+    return pos < 0 or text[pos] in '\r\n'
+
+
+def read_chunks(f, size=CHUNK_CHARS):
+    """Iterate an open text file as lists of whole lines totalling about size characters."""
+    return iter(lambda: f.readlines(size), [])
+
+
+def comment_only(lines, text, spans):
+    """Return a bytearray flagging the lines of text (the concatenated lines) that hold nothing but comments.
+
+    Lines fully inside a multi-line comment always qualify; its first and last
+    lines only qualify if both of them do, so deleting them can never leave
+    half of the comment behind. Spans of consecutive line comments are exempt,
+    since every line of them is a comment of its own.
+    """
+    flags = bytearray(len(lines))
+    if not spans:
+        return flags
+    starts = list(accumulate(map(len, lines), initial=0))
+    multi = []
+    # Spans arrive sorted; walk them line by line, tracking whether only whitespace lies between them
+    line, pos, clean = -1, 0, False
+    for start, end in spans:
+        first = bisect_right(starts, start) - 1
+        if first != line:
+            if line >= 0:
+                flags[line] = clean and not text[pos:starts[line + 1]].strip()
+            line, pos, clean = first, starts[first], True
+        if clean and text[pos:start].strip():
+            clean = False
+        pos = end
+        last = bisect_right(starts, end - 1) - 1
+        if last != first:
+            flags[first] = clean
+            flags[first + 1:last] = b'\x01' * (last - first - 1)
+            # A run of line comments ends with its last line, so only block comments need the pairing rule
+            if not text.startswith(LINE_COMMENTS, start):
+                multi.append((first, last))
+            line, clean = last, True
+    flags[line] = clean and not text[pos:starts[line + 1]].strip()
+
+    for first, last in multi:
+        if not (flags[first] and flags[last]):
+            flags[first] = flags[last] = 0
+    return flags
@@ -1,101 +1,224 @@
 # src/file_checker.py
+import argparse
 import os
-import re
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from import_graph import SOURCE_EXTENSIONS, build_import_graph
+from reference_index import ReferenceIndex
+from repo_snapshot import RepoSnapshot, snapshot_cache
 
+# Persistent per-file reference data, so repeated checks only re-read changed files
+reference_index = ReferenceIndex()
 
-def find_unused_files(folder_path, file_extensions):
-    """Find unused files of specified extensions in the given folder."""
+# 'references' matches filenames anywhere in the tree; 'imports' walks the module import graph
+DETECTION_MODES = ('references', 'imports')
+
+
+@dataclass
+class UnusedFileScan:
+    """Outcome of one unused-file scan; render_scan turns it into the text report."""
+    folder: Path
+    extensions: List[str] = field(default_factory=list)
+    candidates: List[Path] = field(default_factory=list)
+    used: List[Path] = field(default_factory=list)
+    unused: List[Path] = field(default_factory=list)
+    skipped: List[Path] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    mode: str = 'references'
+    error: Optional[str] = None
+    scanned_at: float = field(default_factory=time.time)
+    # File list the scan worked from; a different one means files were added, removed or renamed since
+    snapshot: Optional[RepoSnapshot] = None
+
+
+# Most recent scan per (folder, extensions, options) in this session, reused by delete_unused_files
+_last_scans: Dict[Tuple, UnusedFileScan] = {}
+
+
+def _scan_key(folder_path, file_extensions, include_stems, mode, entry_points):
+    extensions = tuple(ext if ext.startswith('.') else f'.{ext}' for ext in file_extensions.split(','))
+    entries = tuple(entry_points) if entry_points is not None else None
+    return str(Path(folder_path).resolve()), extensions, include_stems, mode, entries
+
+
+def scan_unused_files(folder_path, file_extensions, include_stems=False, workers=1,
+                      mode='references', entry_points=None) -> UnusedFileScan:
+    """Find unused files of specified extensions in the given folder.
+
+    With include_stems, a file also counts as used when its name without the
+    extension appears elsewhere, which is how pythonorphan.sh detects imports.
+    workers > 1 reads and matches changed files in a process pool.
+
+    In 'imports' mode, Python and TS/JS/Svelte files are unused when no entry
+    point (import_graph.DEFAULT_ENTRY_POINTS unless entry_points is given)
+    reaches them through imports; other extensions still use filename matching.
+    """
     print(f"Received folder_path: {folder_path}")
     print(f"Received file_extensions: {file_extensions}")
 
+    started = time.perf_counter()
     folder = Path(folder_path)
-    output = [f"Checking folder: {folder.resolve()}"]
+    scan = UnusedFileScan(folder=folder, mode=mode)
     print(f"Resolved folder: {folder.resolve()}")
 
     if not folder.exists():
-        return "Folder does not exist."
+        scan.error = "Folder does not exist."
+        return scan
     if not folder.is_dir():
-        return "Path is not a directory."
+        scan.error = "Path is not a directory."
+        return scan
+    if mode not in DETECTION_MODES:
+        scan.error = f"Unknown detection mode: {mode}"
+        return scan
 
     # Ensure extensions are properly formatted
-    extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in file_extensions.split(',')]
-    output.append(f"Searching for extensions: {extensions}")
-    print(f"Searching extensions: {extensions}")
-
-    # Collect files for each extension individually
-    files_to_check = []
-    for ext in extensions:
-        found_files = list(folder.rglob(f"*{ext}"))
-        files_to_check.extend(found_files)
+    scan.extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in file_extensions.split(',')]
+    print(f"Searching extensions: {scan.extensions}")
+
+    # One pass over the session snapshot, then group the files by extension in the order they were requested
+    scan.snapshot = snapshot_cache.get(folder)
+    entries = scan.snapshot.files(scan.extensions)
+    for ext in scan.extensions:
+        found_files = [folder / e.rel_path for e in entries if e.name.lower().endswith(ext.lower())]
+        scan.candidates.extend(found_files)
         print(f"Files found with '{ext}': {[str(f) for f in found_files]}")
-
-    output.append(f"Files found: {len(files_to_check)}")
-    if files_to_check:
-        output.append("Detected files:")
-        output.extend([f" - {f}" for f in files_to_check])
-    else:
-        output.append(f"No files with extensions {extensions} found.")
-
-    if not files_to_check:
+    scan.timings['collect'] = time.perf_counter() - started
+
+    if scan.candidates:
+        unreachable = None
+        name_checked = scan.candidates
+        if mode == 'imports':
+            graph = build_import_graph(folder)
+            unreachable = graph.unreachable(entry_points)
+            name_checked = [f for f in scan.candidates if not f.name.endswith(SOURCE_EXTENSIONS)]
+            scan.timings['graph'] = time.perf_counter() - started - scan.timings['collect']
+
+        candidate_names = {f.name for f in name_checked if not f.name.startswith('+')}
+        referenced = set()
+        if candidate_names:
+            referenced = reference_index.referenced_names(folder, candidate_names, include_stems, workers)
+        scan.timings['index'] = time.perf_counter() - started - sum(scan.timings.values())
+
+        for file in scan.candidates:
+            if file.name.startswith('+'):
+                scan.skipped.append(file)
+            elif unreachable is not None and file.name.endswith(SOURCE_EXTENSIONS):
+                (scan.unused if os.path.abspath(file) in unreachable else scan.used).append(file)
+            elif file.name in referenced:
+                scan.used.append(file)
+            else:
+                scan.unused.append(file)
+
+    scan.timings['total'] = time.perf_counter() - started
+    _last_scans[_scan_key(folder_path, file_extensions, include_stems, mode, entry_points)] = scan
+    return scan
+
+
+def render_scan(scan: UnusedFileScan) -> str:
+    """Render a scan as the plain-text report shown in the UI and CLI."""
+    if scan.error:
+        return scan.error
+
+    output = [f"Checking folder: {scan.folder.resolve()}"]
+    output.append(f"Searching for extensions: {scan.extensions}")
+    output.append(f"Files found: {len(scan.candidates)}")
+    if not scan.candidates:
+        output.append(f"No files with extensions {scan.extensions} found.")
         return "\n".join(output)
 
-    unused_files = []
+    output.append("Detected files:")
+    output.extend([f" - {f}" for f in scan.candidates])
     output.append("\nScanning for unused files...")
 
-    for file in files_to_check:
-        filename = file.name
-        if filename.startswith('+'):
-            output.append(f"✓ {filename} (skipped, starts with '+')")
-            continue
-
-        found = False
-        for root, _, files in os.walk(folder):
-            for other_file in files:
-                if other_file == filename:
-                    continue
-                file_path = Path(root) / other_file
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        if re.search(re.escape(filename), f.read()):
-                            found = True
-                            break
-                except Exception:
-                    continue
-            if found:
-                break
-
-        if not found:
-            output.append(f"✗ {filename} (unused)")
-            unused_files.append(str(file))
+    skipped, unused = set(scan.skipped), set(scan.unused)
+    for file in scan.candidates:
+        if file in skipped:
+            output.append(f"✓ {file.name} (skipped, starts with '+')")
+        elif file in unused:
+            output.append(f"✗ {file.name} (unused)")
         else:
-            output.append(f"✓ {filename} (used)")
+            output.append(f"✓ {file.name} (used)")
 
-    if not unused_files:
-        output.append(f"\nNo unused files found for extensions {extensions}.")
+    if not scan.unused:
+        output.append(f"\nNo unused files found for extensions {scan.extensions}.")
     else:
-        output.append(f"\nFound {len(unused_files)} unused file(s):")
-        output.extend([f" - {f}" for f in unused_files])
+        output.append(f"\nFound {len(scan.unused)} unused file(s):")
+        output.extend([f" - {f}" for f in scan.unused])
+
+    return "\n".join(output)
 
-    final_output = "\n".join(output)
+
+def _scan_is_current(scan: UnusedFileScan) -> bool:
+    """Check that no file in the scanned folder was added, removed, renamed or edited since the scan started."""
+    if scan.snapshot is None or snapshot_cache.get(scan.folder) is not scan.snapshot:
+        return False
+    for entry in scan.snapshot.entries:
+        try:
+            if os.stat(entry.path).st_mtime >= scan.scanned_at:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def find_unused_files(folder_path, file_extensions, include_stems=False, workers=1,
+                      mode='references', entry_points=None):
+    """Find unused files of specified extensions and return the text report."""
+    final_output = render_scan(scan_unused_files(folder_path, file_extensions, include_stems, workers,
+                                                 mode, entry_points))
     print("Final output:\n", final_output)
     return final_output
 
 
-def delete_unused_files(folder_path, file_extensions, confirm=False):
-    """Delete unused files of specified extensions if confirmed."""
-    result = find_unused_files(folder_path, file_extensions)
-    if "No unused files" in result or "No files with extensions" in result:
+def delete_unused_files(folder_path, file_extensions, confirm=False, include_stems=False, workers=1,
+                        mode='references', entry_points=None):
+    """Delete unused files of specified extensions if confirmed.
+
+    Reuses the last scan of the same folder and extensions from this session
+    when no file changed since it ran, instead of rescanning the repository.
+    """
+    key = _scan_key(folder_path, file_extensions, include_stems, mode, entry_points)
+    scan = _last_scans.get(key)
+    if scan is None or not _scan_is_current(scan):
+        scan = scan_unused_files(folder_path, file_extensions, include_stems, workers, mode, entry_points)
+    result = render_scan(scan)
+    if scan.error or not scan.unused:
         return result
 
-    unused_files = [line.split(" - ")[1] for line in result.splitlines() if line.startswith(" - ")]
     if not confirm:
         return result + "\n\nSet confirm=True to delete these files."
 
-    for file in unused_files:
+    for file in scan.unused:
         try:
             os.remove(file)
             result += f"\nDeleted: {file}"
         except Exception as e:
             result += f"\nError deleting {file}: {e}"
+    # The repository changed, so the next delete has to scan again
+    _last_scans.pop(key, None)
     return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report (and optionally delete) files that no other file refers to')
+    parser.add_argument('folder_path', help='Path to the repository')
+    parser.add_argument('file_extensions', help='Comma-separated list of extensions to check, e.g. py or svelte,ts')
+    parser.add_argument('--stems', action='store_true',
+                        help='Also treat the filename without its extension as a reference (pythonorphan.sh behaviour)')
+    parser.add_argument('--delete', action='store_true', help='Delete the unused files that were found')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of scanner processes')
+    parser.add_argument('--mode', choices=DETECTION_MODES, default='references',
+                        help="'references' matches filenames anywhere, 'imports' follows the import graph")
+    parser.add_argument('--entry', action='append',
+                        help='Entry-point filename or repo-relative glob for --mode imports (repeatable)')
+    args = parser.parse_args()
+
+    print(delete_unused_files(args.folder_path, args.file_extensions, confirm=args.delete,
+                              include_stems=args.stems, workers=args.workers,
+                              mode=args.mode, entry_points=args.entry))
+
+
+if __name__ == "__main__":
+    main()
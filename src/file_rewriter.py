@@ -0,0 +1,98 @@
+# file_rewriter.py
+import hashlib
+import os
+import stat
+import tempfile
+
+COPY_CHUNK_BYTES = 1 << 20
+
+
+class FileChangedError(Exception):
+    """The file on disk no longer matches the fingerprint taken when it was scanned."""
+
+
+def fingerprint_digest(data: bytes = b''):
+    """Return the hash object for a fingerprint, optionally fed data; update it with the rest of the file's bytes.
+
+    A fingerprint is (mtime_ns, hexdigest), with the mtime stat'ed before the
+    bytes were read so an edit in between shows up as a change.
+    """
+    return hashlib.blake2b(data, digest_size=16)
+
+
+def rewrite_file(path: str, transform, fingerprint=None):
+    """Atomically replace path with the output of transform and return whatever transform returns.
+
+    transform(read, write) streams the old content through read(size) and
+    the new content out through write(data). The result goes to a temp file
+    in the same directory that is fsync'ed and renamed over the original, so
+    a crash leaves either the old or the new file. With a fingerprint
+    (mtime_ns, fingerprint_digest hexdigest) taken when the file was scanned,
+    FileChangedError is raised and nothing is replaced if the mtime or the
+    hash of the bytes read differ.
+
+    A symlink is followed and its target rewritten, so the link stays a link.
+    """
+    path = os.path.realpath(path)
+    before = os.stat(path)
+    if fingerprint is not None and before.st_mtime_ns != fingerprint[0]:
+        raise FileChangedError(f"{path} was modified after it was scanned")
+
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        digest = fingerprint_digest()
+        with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            def read(size=COPY_CHUNK_BYTES):
+                data = src.read(size)
+                digest.update(data)
+                return data
+
+            result = transform(read, dst.write)
+            # Hash whatever the transform left unread
+            while read():
+                pass
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        if fingerprint is not None and digest.hexdigest() != fingerprint[1]:
+            raise FileChangedError(f"{path} was modified after it was scanned")
+        if os.stat(path).st_mtime_ns != before.st_mtime_ns:
+            raise FileChangedError(f"{path} was modified while it was being rewritten")
+        os.chmod(temp_path, stat.S_IMODE(before.st_mode))
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return result
+
+
+def skip_ranges(ranges):
+    """Build a rewrite_file transform that drops the given sorted, non-overlapping (start, end) byte ranges.
+
+    The transform returns the number of bytes removed.
+    """
+    def transform(read, write):
+        pos = removed = 0
+        for start, end in ranges:
+            _pass_bytes(read, write, start - pos)
+            _pass_bytes(read, None, end - start)
+            pos, removed = end, removed + end - start
+        for data in iter(read, b''):
+            write(data)
+        return removed
+    return transform
+
+
+def _pass_bytes(read, write, count):
+    """Read exactly count bytes, writing them out unless write is None."""
+    while count > 0:
+        data = read(min(count, COPY_CHUNK_BYTES))
+        if not data:
+            raise FileChangedError("file is shorter than when it was scanned")
+        if write is not None:
+            write(data)
+        count -= len(data)
@@ -1,11 +1,14 @@
 import gradio as gr
 from llm_backend import llm_interface
 from file_checker import find_unused_files, delete_unused_files
+from import_graph import DEFAULT_ENTRY_POINTS
 from repo_file_combiner import RepoFileCombiner
 from comment_finder import CommentFinder
 from camel_case_finder import CamelCaseFinder
 from code_improver import CodeImprover
+from llm_executor import LLM_CONCURRENCY, LLM_REQUESTS_PER_MINUTE
 from repo_analyzer import RepoAnalyzer
+from repo_snapshot import list_files, snapshot_cache
 import os
 
 # Create instances of the classes
@@ -24,8 +27,11 @@ def update_folder_path(input_path: str) -> str:
     Validates and returns the folder path entered by the user.
     """
     if not input_path.strip():
+        snapshot_cache.invalidate(DEFAULT_MOUNT_PATH)
         return DEFAULT_MOUNT_PATH
     if os.path.isdir(input_path):
+        # Re-walk on the next click so tabs see files changed outside the UI
+        snapshot_cache.invalidate(input_path)
         return input_path
     return f"Error: '{input_path}' is not a valid directory. Using default: {DEFAULT_MOUNT_PATH}"
 
@@ -74,64 +80,129 @@ with gr.Blocks(title="CodeFixer") as demo:
         with gr.Tab("File Checker"):
             with gr.Row():
                 with gr.Column():
+                    detection_mode = gr.Radio(
+                        label="Detection Mode",
+                        choices=["Filename references", "Import graph"],
+                        value="Filename references"
+                    )
+                    entry_points_input = gr.Textbox(
+                        label="Entry Points (Import graph mode)",
+                        value=", ".join(DEFAULT_ENTRY_POINTS),
+                        placeholder="Comma-separated filenames or repo-relative globs, e.g. main.py, +*, src/routes/**"
+                    )
                     check_btn = gr.Button("Check Unused Files")
                     delete_btn = gr.Button("Delete Unused Files")
                 with gr.Column():
                     check_output = gr.Textbox(label="File Check Results", lines=10)
 
-            def check_files(repo_path, exts):
+            def file_check_options(mode, entry_points):
+                entries = [e.strip() for e in entry_points.split(",") if e.strip()]
+                return {
+                    "workers": os.cpu_count() or 1,
+                    "mode": "imports" if mode == "Import graph" else "references",
+                    "entry_points": entries or None,
+                }
+
+            def check_files(repo_path, exts, mode, entry_points):
                 if not repo_path or not os.path.isdir(repo_path):
                     return "Please enter a valid repository folder path"
                 ext_string = ",".join(exts)
-                return find_unused_files(repo_path, ext_string)
+                return find_unused_files(repo_path, ext_string, **file_check_options(mode, entry_points))
 
-            def delete_files(repo_path, exts):
+            def delete_files(repo_path, exts, mode, entry_points):
                 if not repo_path or not os.path.isdir(repo_path):
                     return "Please enter a valid repository folder path"
                 ext_string = ",".join(exts)
-                return delete_unused_files(repo_path, ext_string, confirm=True)
+                return delete_unused_files(repo_path, ext_string, confirm=True, **file_check_options(mode, entry_points))
 
             check_btn.click(
                 fn=check_files,
-                inputs=[repo_input, ext_dropdown],
+                inputs=[repo_input, ext_dropdown, detection_mode, entry_points_input],
                 outputs=check_output
             )
             delete_btn.click(
                 fn=delete_files,
-                inputs=[repo_input, ext_dropdown],
+                inputs=[repo_input, ext_dropdown, detection_mode, entry_points_input],
                 outputs=check_output
             )
 
         with gr.Tab("File Combiner"):
             with gr.Row():
                 with gr.Column():
+                    shard_budget_input = gr.Number(
+                        label="Shard Budget (0 = single combined_code.txt)",
+                        value=0,
+                        precision=0
+                    )
+                    budget_unit_input = gr.Radio(
+                        label="Budget Unit",
+                        choices=["bytes", "tokens"],
+                        value="tokens"
+                    )
+                    incremental_input = gr.Checkbox(
+                        label="Incremental (reuse sections of unchanged files)",
+                        value=False
+                    )
+                    dedup_input = gr.Checkbox(
+                        label="Deduplicate identical files",
+                        value=False
+                    )
+                    output_format_input = gr.Radio(
+                        label="Output Format",
+                        choices=["text", "jsonl"],
+                        value="text"
+                    )
+                    compression_input = gr.Radio(
+                        label="Compression",
+                        choices=["none", "gzip", "zstd"],
+                        value="none"
+                    )
                     combine_btn = gr.Button("Combine Repository Files")
                 with gr.Column():
                     combine_output = gr.Textbox(label="Combine Output", lines=10)
 
-            def process_repo_and_combine(repo_path, exts):
+            def process_repo_and_combine(repo_path, exts, shard_budget, budget_unit, incremental, dedup,
+                                         output_format, compression):
                 if not repo_path or not os.path.isdir(repo_path):
                     return "Please enter a valid repository folder path"
                 repo_combiner.select_repository(repo_path)
-                return repo_combiner.combine_files(approved_extensions=exts)
+                return repo_combiner.combine_files(
+                    approved_extensions=exts,
+                    shard_budget=int(shard_budget or 0),
+                    budget_unit=budget_unit,
+                    incremental=incremental,
+                    dedup=dedup,
+                    output_format=output_format,
+                    compression=None if compression == "none" else compression
+                )
 
             combine_btn.click(
                 fn=process_repo_and_combine,
-                inputs=[repo_input, ext_dropdown],
+                inputs=[repo_input, ext_dropdown, shard_budget_input, budget_unit_input, incremental_input,
+                        dedup_input, output_format_input, compression_input],
                 outputs=combine_output
             )
 
         with gr.Tab("Comment Finder"):
             with gr.Row():
                 with gr.Column():
+                    docstrings_input = gr.Checkbox(
+                        label="Treat Python docstrings as comments",
+                        value=False
+                    )
+                    streaming_input = gr.Checkbox(
+                        label="Low-memory scan (record positions, load text on export)",
+                        value=False
+                    )
                     scan_btn = gr.Button("Scan for Comments")
                     delete_comments_btn = gr.Button("Delete Comments")
                     export_btn = gr.Button("Export Results")
                 with gr.Column():
                     comment_output = gr.Textbox(label="Comment Finder Results", lines=10)
 
-            def scan_comments(repo_path, exts):
-                return comment_finder.scan_directory(repo_path, exts)
+            def scan_comments(repo_path, exts, include_docstrings, streaming):
+                return comment_finder.scan_directory(repo_path, exts, include_docstrings=include_docstrings,
+                                                     workers=os.cpu_count() or 1, streaming=streaming)
 
             def delete_comments(repo_path):
                 return comment_finder.delete_comments(repo_path)
@@ -141,7 +212,7 @@ with gr.Blocks(title="CodeFixer") as demo:
 
             scan_btn.click(
                 fn=scan_comments,
-                inputs=[repo_input, ext_dropdown],
+                inputs=[repo_input, ext_dropdown, docstrings_input, streaming_input],
                 outputs=comment_output
             )
             delete_comments_btn.click(
@@ -172,7 +243,7 @@ with gr.Blocks(title="CodeFixer") as demo:
                 return camel_case_finder.scan_directory(repo_path, exts, model, progress)
 
             def replace_snake_case(repo_path, exts):
-                return camel_case_finder.replace_with_snake_case(repo_path, exts)
+                return camel_case_finder.replace_with_snake_case(repo_path, exts, workers=os.cpu_count() or 1)
 
             def export_snake_case(repo_path):
                 return camel_case_finder.export_results(repo_path)
@@ -220,11 +291,17 @@ with gr.Blocks(title="CodeFixer") as demo:
                         ],
                         value=["Add Docstrings", "Improve Formatting"]
                     )
+                    concurrency_input = gr.Slider(
+                        label="Concurrent Requests", minimum=1, maximum=32, step=1, value=LLM_CONCURRENCY
+                    )
+                    requests_per_minute_input = gr.Number(
+                        label="Requests per Minute (0 = unlimited)", value=LLM_REQUESTS_PER_MINUTE, minimum=0
+                    )
                     improve_btn = gr.Button("Improve Code")
                 with gr.Column():
                     improve_output = gr.Textbox(label="Improvement Results", lines=10)
 
-            def improve_code(repo_path, exts, options, model, progress=gr.Progress()):
+            def improve_code(repo_path, exts, options, model, concurrency, requests_per_minute, progress=gr.Progress()):
                 if not repo_path or not os.path.isdir(repo_path):
                     return "Please enter a valid repository folder path"
 
@@ -233,39 +310,15 @@ with gr.Blocks(title="CodeFixer") as demo:
                     "Enhance Error Handling", "Verify Documentation", "Remove i18n",
                     "Restrict AI Providers", "Cleanup Dependencies"
                 ]}
-
-                extensions = {f".{ext}" if not ext.startswith('.') else ext for ext in exts}
-                unsupported = extensions - code_improver.SUPPORTED_EXTENSIONS
-                if unsupported:
-                    extensions -= unsupported
-
-                files_to_process = [
-                    os.path.join(root, file)
-                    for root, _, files in os.walk(repo_path)
-                    for file in files
-                    if os.path.splitext(file)[1].lower() in extensions
-                ]
-                total_files = len(files_to_process)
-
-                if total_files == 0:
-                    return "No files found matching the selected extensions."
-
-                progress(0, desc="Starting code improvement...")
-                output = ["Improving scripts..."]
-                processed_files = 0
-
-                for file_path in files_to_process:
-                    result = code_improver.improve_file(file_path, options_dict, model)
-                    output.append(result)
-                    processed_files += 1
-                    progress(processed_files / total_files, desc=f"Processed {processed_files}/{total_files} files")
-
-                output.append("Improvement complete.")
-                return "\n".join(output)
+                return code_improver.improve_directory(repo_path, set(exts), options_dict, model,
+                                                       concurrency=int(concurrency),
+                                                       requests_per_minute=requests_per_minute or 0,
+                                                       progress=progress)
 
             improve_btn.click(
                 fn=improve_code,
-                inputs=[repo_input, ext_dropdown, improvement_options, model_input],
+                inputs=[repo_input, ext_dropdown, improvement_options, model_input, concurrency_input,
+                        requests_per_minute_input],
                 outputs=improve_output
             )
 
@@ -288,10 +341,7 @@ with gr.Blocks(title="CodeFixer") as demo:
                 repo_analyzer.github_base_url = github_url
 
                 exts = [f".{ext}" if not ext.startswith('.') else ext for ext in exts]
-                total_files = sum(
-                    len([f for f in files if os.path.splitext(f)[1].lower() in exts])
-                    for _, _, files in os.walk(repo_path)
-                )
+                total_files = len(list_files(repo_path, exts, include_hidden=False))
                 if total_files == 0:
                     return "No files found matching the selected extensions."
 
@@ -0,0 +1,261 @@
+# import_graph.py
+import fnmatch
+import json
+import os
+import re
+import sqlite3
+from collections import deque
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Set
+from reference_index import DEFAULT_INDEX_PATH
+from repo_snapshot import list_files
+
+PYTHON_EXTENSIONS = ('.py',)
+SCRIPT_EXTENSIONS = ('.ts', '.js', '.tsx', '.jsx', '.mjs', '.cjs', '.svelte')
+SOURCE_EXTENSIONS = PYTHON_EXTENSIONS + SCRIPT_EXTENSIONS
+
+# Filenames (or repo-relative globs when they contain '/') that are always treated as roots of the graph
+DEFAULT_ENTRY_POINTS = [
+    'main.py', 'app.py', 'server.py', 'config.py', 'setup.py', 'manage.py', '__init__.py',
+    'conftest.py', 'test_*.py', '*_test.py',
+    '+*', 'hooks.*.ts', 'hooks.*.js', '*.config.ts', '*.config.js', '*.config.mjs',
+]
+# Files defining HTTP endpoints are entry points even if nothing imports them
+DEFAULT_ENTRY_CONTENT = r'@(?:app|router|bp|blueprint)\.(?:route|get|post|put|patch|delete|websocket)\b'
+
+PY_IMPORT = re.compile(r'^[ \t]*import[ \t]+([\w.]+(?:[ \t]+as[ \t]+\w+)?(?:[ \t]*,[ \t]*[\w.]+(?:[ \t]+as[ \t]+\w+)?)*)', re.MULTILINE)
+PY_FROM_IMPORT = re.compile(r'^[ \t]*from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+(\([^)]*\)|[^\n#]*)', re.MULTILINE)
+JS_IMPORT = re.compile(
+    r'''(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)['"]([^'"\n]+)['"]'''
+)
+SCRIPT_RESOLVE_SUFFIXES = ['', '.ts', '.js', '.svelte', '.tsx', '.jsx', '.mjs', '.cjs', '.d.ts', '.json',
+                           '/index.ts', '/index.js', '/index.svelte', '/index.tsx', '/index.jsx']
+# Path aliases resolved against the importing app's root (SvelteKit and common Vite setups)
+SCRIPT_ALIASES = {'$lib': 'src/lib', '@': 'src', '~': 'src'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS import_files (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    entry_pattern TEXT NOT NULL,
+    specifiers TEXT NOT NULL,
+    decorated INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+) WITHOUT ROWID;
+"""
+
+
+def parse_imports(content: str, ext: str) -> List[str]:
+    """Return the raw import specifiers of one source file.
+
+    Python imports come back as dotted names with leading dots for relative
+    imports; 'from a import b' yields both 'a' and 'a.b' since b may be a module.
+    """
+    specifiers = []
+    if ext in PYTHON_EXTENSIONS:
+        for match in PY_IMPORT.finditer(content):
+            for part in match.group(1).split(','):
+                specifiers.append(part.split()[0])
+        for match in PY_FROM_IMPORT.finditer(content):
+            module = match.group(1)
+            specifiers.append(module)
+            sep = '' if module.endswith('.') else '.'
+            for name in match.group(2).strip('()').replace('\n', ' ').split(','):
+                name = name.split()[0] if name.split() else ''
+                if name and name != '*' and name.isidentifier():
+                    specifiers.append(f"{module}{sep}{name}")
+    elif ext in SCRIPT_EXTENSIONS:
+        specifiers.extend(match.group(1) for match in JS_IMPORT.finditer(content))
+    return specifiers
+
+
+class ImportGraph:
+    """Module dependency graph of the Python and TS/JS/Svelte files under a root."""
+
+    def __init__(self, root: str, specifiers: Dict[str, List[str]], decorated: Set[str]):
+        self.root = root
+        self.files = set(specifiers)
+        self.decorated = decorated
+        self._py_by_suffix = {}
+        for path in self.files:
+            if path.endswith(PYTHON_EXTENSIONS):
+                parts = os.path.relpath(path, root).split(os.sep)
+                for i in range(len(parts)):
+                    self._py_by_suffix.setdefault('/'.join(parts[i:]), []).append(path)
+        self.imports = {path: self._resolve_all(path, specs) for path, specs in specifiers.items()}
+        self._importers = None
+
+    def _resolve_all(self, path: str, specifiers: Iterable[str]) -> Set[str]:
+        resolved = set()
+        resolve = self._resolve_python if path.endswith(PYTHON_EXTENSIONS) else self._resolve_script
+        for spec in specifiers:
+            resolved.update(resolve(path, spec))
+        resolved.discard(path)
+        return resolved
+
+    def _resolve_python(self, importer: str, spec: str) -> Set[str]:
+        level = len(spec) - len(spec.lstrip('.'))
+        parts = [p for p in spec[level:].split('.') if p]
+        if level:
+            base = os.path.dirname(importer)
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+            stem = os.path.join(base, *parts)
+            return {p for p in (stem + '.py', os.path.join(stem, '__init__.py')) if p in self.files}
+        if not parts:
+            return set()
+
+        found = set()
+        for key in ('/'.join(parts) + '.py', '/'.join(parts + ['__init__.py'])):
+            candidates = self._py_by_suffix.get(key, [])
+            # Prefer a sibling (flat imports as in this repo's src/), then the repo root, else keep every match
+            local = [c for c in candidates if c == os.path.join(os.path.dirname(importer), key.replace('/', os.sep))]
+            rooted = [c for c in candidates if c == os.path.join(self.root, key.replace('/', os.sep))]
+            found.update(local or rooted or candidates)
+        # Importing a.b.c also runs the __init__.py of every enclosing package
+        for path in list(found):
+            package_dir = os.path.dirname(path)
+            while package_dir.startswith(self.root) and package_dir != self.root:
+                init = os.path.join(package_dir, '__init__.py')
+                if init not in self.files:
+                    break
+                found.add(init)
+                package_dir = os.path.dirname(package_dir)
+        return found
+
+    def _resolve_script(self, importer: str, spec: str) -> Set[str]:
+        if spec.startswith('.'):
+            return self._resolve_script_path(os.path.normpath(os.path.join(os.path.dirname(importer), spec)))
+
+        alias, _, rest = spec.partition('/')
+        if alias not in SCRIPT_ALIASES:
+            # Bare specifiers are packages from node_modules
+            return set()
+        # Aliases are relative to the app's own root, which may sit below the repo root in a monorepo
+        app_dir = os.path.dirname(importer)
+        while True:
+            found = self._resolve_script_path(os.path.normpath(os.path.join(app_dir, SCRIPT_ALIASES[alias], rest)))
+            if found or app_dir == self.root or not app_dir.startswith(self.root):
+                return found
+            app_dir = os.path.dirname(app_dir)
+
+    def _resolve_script_path(self, base: str) -> Set[str]:
+        for suffix in SCRIPT_RESOLVE_SUFFIXES:
+            if base + suffix in self.files:
+                return {base + suffix}
+        # TypeScript ESM code imports './x.js' for a file that is really './x.ts'
+        stem, ext = os.path.splitext(base)
+        if ext in ('.js', '.mjs', '.cjs'):
+            for suffix in ('.ts', '.tsx', '.mts', '.cts'):
+                if stem + suffix in self.files:
+                    return {stem + suffix}
+        return set()
+
+    def importers_of(self, path: str) -> Set[str]:
+        """Return the files that import path."""
+        if self._importers is None:
+            self._importers = {}
+            for importer, targets in self.imports.items():
+                for target in targets:
+                    self._importers.setdefault(target, set()).add(importer)
+        return self._importers.get(path, set())
+
+    def entry_points(self, patterns: Optional[Iterable[str]] = None) -> Set[str]:
+        """Return files matching the entry-point globs plus files with endpoint decorators."""
+        patterns = list(DEFAULT_ENTRY_POINTS if patterns is None else patterns)
+        entries = set(self.decorated)
+        for path in self.files:
+            name = os.path.basename(path)
+            relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+            if any(fnmatch.fnmatchcase(relative if '/' in p else name, p) for p in patterns):
+                entries.add(path)
+        return entries
+
+    def reachable(self, entries: Iterable[str]) -> Set[str]:
+        """Return every file reachable from entries by following imports."""
+        seen = set(entries)
+        queue = deque(seen)
+        while queue:
+            for target in self.imports.get(queue.popleft(), ()):
+                if target not in seen:
+                    seen.add(target)
+                    queue.append(target)
+        return seen
+
+    def unreachable(self, patterns: Optional[Iterable[str]] = None) -> Set[str]:
+        """Return the files no entry point can reach."""
+        return self.files - self.reachable(self.entry_points(patterns))
+
+
+# Graphs built in this session, reused while no source file has changed
+_graphs: Dict[tuple, ImportGraph] = {}
+
+
+def build_import_graph(folder: str, entry_content: str = DEFAULT_ENTRY_CONTENT,
+                       db_path: str = DEFAULT_INDEX_PATH) -> ImportGraph:
+    """Build the import graph of folder in one pass, re-parsing only files whose size or mtime changed.
+
+    Parsed specifiers are persisted next to the reference index, so other
+    tools and later sessions can reuse the graph cheaply.
+    """
+    root = os.path.abspath(folder)
+    entry_re = re.compile(entry_content) if entry_content else None
+
+    stats = {}
+    for entry in list_files(root, SOURCE_EXTENSIONS):
+        # Fresh stat: the snapshot does not notice in-place edits
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            continue
+        stats[entry.path] = (st.st_size, st.st_mtime_ns)
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    with closing(sqlite3.connect(db_path, timeout=30)) as conn, conn:
+        conn.executescript(SCHEMA)
+        cached = {
+            path: (size, mtime_ns, pattern, specs, decorated)
+            for path, size, mtime_ns, pattern, specs, decorated in conn.execute(
+                "SELECT path, size, mtime_ns, entry_pattern, specifiers, decorated FROM import_files WHERE root = ?",
+                (root,))
+        }
+
+        key = (root, entry_content)
+        unchanged = stats.keys() == cached.keys() and all(
+            cached[p][:3] == (size, mtime_ns, entry_content or '') for p, (size, mtime_ns) in stats.items()
+        )
+        if unchanged and key in _graphs:
+            return _graphs[key]
+
+        specifiers, decorated = {}, set()
+        for path, (size, mtime_ns) in stats.items():
+            row = cached.get(path)
+            if row and row[:3] == (size, mtime_ns, entry_content or ''):
+                specifiers[path] = json.loads(row[3])
+                if row[4]:
+                    decorated.add(path)
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                specifiers[path] = []
+                continue
+            specifiers[path] = parse_imports(content, os.path.splitext(path)[1].lower())
+            is_decorated = bool(entry_re and entry_re.search(content))
+            if is_decorated:
+                decorated.add(path)
+            conn.execute(
+                "INSERT OR REPLACE INTO import_files (root, path, size, mtime_ns, entry_pattern, specifiers, decorated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (root, path, size, mtime_ns, entry_content or '', json.dumps(specifiers[path]), int(is_decorated))
+            )
+
+        removed = [(root, path) for path in cached if path not in stats]
+        conn.executemany("DELETE FROM import_files WHERE root = ? AND path = ?", removed)
+
+    graph = ImportGraph(root, specifiers, decorated)
+    _graphs[key] = graph
+    return graph
@@ -0,0 +1,77 @@
+# llm_executor.py
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Requests sent to the LLM server at once; set it to the server's OLLAMA_NUM_PARALLEL
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+# Average requests per minute across all threads, 0 for no limit
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+
+
+class RateLimiter:
+    """Thread-safe token bucket: requests_per_minute on average, up to burst requests at once.
+
+    A requests_per_minute of 0 or None disables the limit.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may send one request."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+            self.updated = now
+            # Take a token now even if the bucket is empty; callers queue up behind the debt
+            self.tokens -= 1
+            delay = -self.tokens * self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_concurrently(func, items, concurrency: int = None, requests_per_minute: float = None, queue_size: int = None):
+    """Call func(item) for every item on up to concurrency threads and yield (item, result) as calls finish.
+
+    Each call waits its turn on a shared RateLimiter first. At most
+    concurrency + queue_size items are submitted and not yet yielded, so items
+    is consumed lazily. An exception from func is raised here and the
+    queued calls are cancelled; stopping the iteration early cancels them too.
+    """
+    concurrency = max(1, concurrency or LLM_CONCURRENCY)
+    if requests_per_minute is None:
+        requests_per_minute = LLM_REQUESTS_PER_MINUTE
+    queue_size = concurrency if queue_size is None else max(0, queue_size)
+    limiter = RateLimiter(requests_per_minute, burst=concurrency)
+
+    def call(item):
+        limiter.acquire()
+        return func(item)
+
+    pending = {}
+    with ThreadPoolExecutor(concurrency) as pool:
+        try:
+            for item in items:
+                if len(pending) >= concurrency + queue_size:
+                    yield from _finished(pending)
+                pending[pool.submit(call, item)] = item
+            while pending:
+                yield from _finished(pending)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _finished(pending):
+    """Wait for at least one future in pending, then pop and yield (item, result) for every finished one."""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        yield pending.pop(future), future.result()
@@ -0,0 +1,119 @@
+# multi_pattern_matcher.py
+import argparse
+import os
+from collections import deque
+from repo_walker import DEFAULT_EXCLUDED_DIRS, walk_repo
+
+
+class MultiPatternMatcher:
+    """Aho-Corasick automaton that finds every occurrence of many literal patterns in one pass over the bytes."""
+
+    def __init__(self, patterns):
+        # Keep first-seen order and drop empty strings, which would match everywhere
+        self.patterns = [p for p in dict.fromkeys(patterns) if p]
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for byte in pattern.encode('utf-8'):
+                next_state = self._goto[state].get(byte)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][byte] = next_state
+                state = next_state
+            self._out[state] += (pattern_id,)
+
+        # Breadth-first pass to set failure links and merge suffix outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for byte, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and byte not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                fallback = self._goto[fallback].get(byte, 0)
+                self._fail[next_state] = fallback
+                self._out[next_state] += self._out[fallback]
+
+        # Transitions are resolved lazily into a DFA so repeat lookups are a single dict hit
+        self._delta = [dict(edges) for edges in self._goto]
+
+    def _transition(self, state, byte):
+        """Follow failure links for a transition missing from the DFA cache and memoize the result."""
+        current = state
+        while current and byte not in self._goto[current]:
+            current = self._fail[current]
+        next_state = self._goto[current].get(byte, 0)
+        self._delta[state][byte] = next_state
+        return next_state
+
+    def scan(self, data):
+        """Return the set of patterns that occur anywhere in data (bytes or str)."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        delta, out = self._delta, self._out
+        hit_ids = set()
+        state = 0
+        for byte in data:
+            next_state = delta[state].get(byte)
+            if next_state is None:
+                next_state = self._transition(state, byte)
+            state = next_state
+            if out[state]:
+                hit_ids.update(out[state])
+
+        return {self.patterns[i] for i in hit_ids}
+
+    def scan_file(self, file_path):
+        """Read a file once as bytes and return the set of patterns it contains."""
+        with open(file_path, 'rb') as f:
+            return self.scan(f.read())
+
+
+def filename_patterns(filenames, include_stems=False):
+    """Map each search pattern to the filenames it stands for, optionally adding extension-less stems."""
+    patterns = {}
+    for filename in filenames:
+        patterns.setdefault(filename, set()).add(filename)
+        if include_stems:
+            stem = os.path.splitext(filename)[0]
+            if stem:
+                patterns.setdefault(stem, set()).add(filename)
+    return patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List files that contain any of the given literal patterns (like grep -rlF -f)')
+    parser.add_argument('patterns_file', help='File with one literal pattern per line')
+    parser.add_argument('paths', nargs='+', help='Files or directories to scan')
+    parser.add_argument('--exclude-dirs', default=','.join(sorted(DEFAULT_EXCLUDED_DIRS)),
+                        help='Comma-separated list of directories to skip')
+    args = parser.parse_args()
+
+    with open(args.patterns_file, 'r', encoding='utf-8') as f:
+        matcher = MultiPatternMatcher(line.rstrip('\n') for line in f)
+    exclude_dirs = set(args.exclude_dirs.split(','))
+
+    for path in args.paths:
+        if os.path.isfile(path):
+            targets = [path]
+        else:
+            targets = (entry.path for entry in walk_repo(path, exclude_dirs=exclude_dirs))
+        for target in targets:
+            try:
+                hits = matcher.scan_file(target)
+            except OSError:
+                continue
+            for pattern in sorted(hits):
+                print(f"{target}:{pattern}")
+
+
+if __name__ == "__main__":
+    main()
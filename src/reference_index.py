@@ -0,0 +1,190 @@
+# reference_index.py
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from multiprocessing import Pool
+from multi_pattern_matcher import MultiPatternMatcher, filename_patterns
+from repo_snapshot import list_files
+
+DEFAULT_CACHE_DIR = os.getenv("CODE_HELPER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "code_helper"))
+DEFAULT_INDEX_PATH = os.path.join(DEFAULT_CACHE_DIR, "reference_index.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    readable INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hits (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    PRIMARY KEY (root, path, pattern)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS patterns (
+    root TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    PRIMARY KEY (root, pattern)
+) WITHOUT ROWID;
+"""
+
+
+def content_hash(data: bytes) -> str:
+    """Return a short, stable digest of a file's bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ReferenceIndex:
+    """On-disk record of which filename patterns every file in a repository contains.
+
+    Rows are keyed by path, size, mtime and content hash, so a repeated scan
+    only re-reads files that changed since the last run. Every file row of a
+    root has been scanned against all patterns recorded for that root.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _walk(self, root: str):
+        """Yield (path, size, mtime_ns) for every file under root except the index database itself."""
+        db_path = os.path.abspath(self.db_path)
+        skip = (db_path, db_path + "-wal", db_path + "-shm", db_path + "-journal")
+        for entry in list_files(root, exclude_paths=skip):
+            # Fresh stat: the snapshot does not notice in-place edits
+            try:
+                st = os.stat(entry.path)
+            except OSError:
+                continue
+            yield entry.path, st.st_size, st.st_mtime_ns
+
+    def referenced_names(self, folder, filenames, include_stems=False, workers=1):
+        """Bring the index for folder up to date and return the filenames referenced by some other file.
+
+        With workers > 1, changed files are read and matched in a process pool;
+        each worker sends back only its small per-file hit lists.
+        """
+        root = os.path.abspath(folder)
+        patterns = filename_patterns(filenames, include_stems)
+
+        with closing(self._connect()) as conn, conn:
+            cached = {
+                path: (size, mtime_ns, digest)
+                for path, size, mtime_ns, digest in conn.execute(
+                    "SELECT path, size, mtime_ns, hash FROM files WHERE root = ?", (root,))
+            }
+            known_patterns = {p for (p,) in conn.execute("SELECT pattern FROM patterns WHERE root = ?", (root,))}
+            new_patterns = [p for p in patterns if p not in known_patterns]
+            all_patterns = list(known_patterns) + new_patterns
+
+            seen = set()
+            tasks = []
+            for path, size, mtime_ns in self._walk(root):
+                seen.add(path)
+                row = cached.get(path)
+                if row and row[0] == size and row[1] == mtime_ns and not new_patterns:
+                    continue
+                tasks.append((path, size, mtime_ns, row[2] if row else None))
+
+            if tasks:
+                if workers > 1 and len(tasks) > 1:
+                    with Pool(min(workers, len(tasks)), initializer=_init_worker,
+                              initargs=(all_patterns, new_patterns)) as pool:
+                        self._store_results(conn, root, seen, pool.imap_unordered(_scan_file, tasks, chunksize=32))
+                else:
+                    _init_worker(all_patterns, new_patterns)
+                    self._store_results(conn, root, seen, map(_scan_file, tasks))
+
+            removed = [(root, path) for path in cached if path not in seen]
+            if removed:
+                conn.executemany("DELETE FROM files WHERE root = ? AND path = ?", removed)
+                conn.executemany("DELETE FROM hits WHERE root = ? AND path = ?", removed)
+            conn.executemany(
+                "INSERT OR IGNORE INTO patterns (root, pattern) VALUES (?, ?)",
+                ((root, pattern) for pattern in new_patterns)
+            )
+
+            referenced = set()
+            for path, pattern in conn.execute("SELECT path, pattern FROM hits WHERE root = ?", (root,)):
+                names = patterns.get(pattern)
+                if names:
+                    # A file never counts as a reference to its own name
+                    referenced.update(names - {os.path.basename(path)})
+
+        return referenced
+
+    def _store_results(self, conn, root, seen, results):
+        """Merge per-file scan results into the index as they arrive."""
+        for path, size, mtime_ns, digest, readable, replace_hits, hits in results:
+            if digest is None:
+                # Drop unreadable files from the index so they are retried next run
+                seen.discard(path)
+                continue
+            if replace_hits:
+                conn.execute("DELETE FROM hits WHERE root = ? AND path = ?", (root, path))
+            if hits:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO hits (root, path, pattern) VALUES (?, ?, ?)",
+                    ((root, path, pattern) for pattern in hits)
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO files (root, path, size, mtime_ns, hash, readable) VALUES (?, ?, ?, ?, ?, ?)",
+                (root, path, size, mtime_ns, digest, readable)
+            )
+
+
+# Per-process matcher state, set up once by _init_worker instead of being pickled with every task
+_worker_patterns = {}
+_worker_matchers = {}
+
+
+def _init_worker(all_patterns, new_patterns):
+    """Record the pattern lists this process matches against."""
+    _worker_patterns.clear()
+    _worker_matchers.clear()
+    _worker_patterns['all'] = all_patterns
+    _worker_patterns['new'] = new_patterns
+
+
+def _matcher(kind):
+    """Build the 'all' or 'new' automaton on first use in this process."""
+    if kind not in _worker_matchers:
+        patterns = _worker_patterns[kind]
+        _worker_matchers[kind] = MultiPatternMatcher(patterns) if patterns else None
+    return _worker_matchers[kind]
+
+
+def _scan_file(task):
+    """Read one file and return its fingerprint plus hits, never the file contents."""
+    path, size, mtime_ns, cached_digest = task
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return path, size, mtime_ns, None, 0, False, []
+
+    digest = content_hash(data)
+    try:
+        # Match the old text-mode reader, which skipped anything that is not valid UTF-8
+        data.decode('utf-8')
+        readable = 1
+    except UnicodeDecodeError:
+        readable = 0
+
+    # Same content: earlier hits still hold, only the new patterns need a look
+    replace_hits = digest != cached_digest
+    matcher = _matcher('all' if replace_hits else 'new')
+    hits = list(matcher.scan(data)) if readable and matcher is not None else []
+    return path, size, mtime_ns, digest, readable, replace_hits, hits
@@ -4,6 +4,7 @@ import os
 import datetime
 from typing import Dict, Tuple, List
 from llm_backend import llm_interface
+from repo_snapshot import list_files
 
 
 class RepoAnalyzer:
@@ -34,37 +35,23 @@ class RepoAnalyzer:
         """Generate the markdown tree structure with collapsible directories."""
         if not os.path.exists(startpath):
             return f"The path '{startpath}' does not exist.", 0
+        # Directory keys below come from os.path.dirname, so 't1/' or './t1' must match them as 't1'
+        startpath = os.path.normpath(startpath)
 
         tree = ["## 📂 Repository Structure\n\n"]
         processed_files_count = 0
         allowed_extensions = tuple(f".{ext}" if not ext.startswith('.') else ext for ext in extensions)
 
-        # Build directory structure
-        dir_structure = {}
-        queue = [(startpath, None)]
-
-        while queue:
-            current_path, parent = queue.pop(0)
-            files = []
-            dirs = []
-
-            try:
-                for item in os.listdir(current_path):
-                    full_path = os.path.join(current_path, item)
-                    if os.path.isfile(full_path) and item.endswith(allowed_extensions) and not item.startswith('.'):
-                        files.append(item)
-                    elif os.path.isdir(full_path) and not item.startswith('.') and item != 'node_modules':
-                        dirs.append(item)
-                        queue.append((full_path, current_path))
-            except Exception as e:
-                print(f"Error accessing directory {current_path}: {e}")
-                continue
-
-            dir_structure[current_path] = {
-                'files': files,
-                'parent': parent,
-                'name': os.path.basename(current_path) if current_path != startpath else '.'
-            }
+        # Build directory structure from the session snapshot; only directories holding matching files appear
+        dir_structure = {startpath: {'files': [], 'parent': None, 'name': '.'}}
+        for entry in list_files(startpath, allowed_extensions, include_hidden=False):
+            current_path = os.path.dirname(os.path.join(startpath, entry.rel_path))
+            path = current_path
+            while path not in dir_structure:
+                parent = os.path.dirname(path)
+                dir_structure[path] = {'files': [], 'parent': parent, 'name': os.path.basename(path)}
+                path = parent
+            dir_structure[current_path]['files'].append(entry.name)
 
         def process_files(path: str, files: List[str]) -> str:
             nonlocal processed_files_count
@@ -1,5 +1,44 @@
 # repo_file_combiner.py
+import codecs
+import gzip
+import hashlib
+import io
+import json
 import os
+import re
+import shutil
+import tempfile
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from repo_snapshot import list_files
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bytes read to decide whether a file is binary, and the share of control bytes that marks it as such
+BINARY_SNIFF_BYTES = 8192
+BINARY_CONTROL_RATIO = 0.3
+TEXT_BYTES = bytes(range(32, 256)) + b'\t\n\r\f\b\x1b'
+# Read size for the byte-level copy into the combined output
+COPY_CHUNK_BYTES = 1024 * 1024
+SECTION_END = "\n\n" + "=" * 80 + "\n\n"
+# Files up to this size are read whole by the read-ahead threads; larger ones are streamed by the writer
+PREFETCH_MAX_BYTES = COPY_CHUNK_BYTES
+# Files kept in flight per read-ahead thread
+PREFETCH_WINDOW = 4
+
+# Outputs of earlier sharded runs, which must never be combined into a new run
+SHARD_NAME = re.compile(r'combined_code_(?:\d{3,}\.txt|manifest\.json)')
+# File suffixes of the single-file output formats and compressions
+OUTPUT_FORMATS = {'text': '.txt', 'jsonl': '.jsonl'}
+COMPRESSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+# Sections bigger than this are staged on disk before going into a compressed or JSONL output
+SPOOL_MAX_BYTES = 4 * COPY_CHUNK_BYTES
+# Sidecar kept next to combined_code.txt by incremental runs: where each file's section sits in the output
+INDEX_NAME = "combined_code_index.json"
+INDEX_VERSION = 2
 
 
 class RepoFileCombiner:
@@ -16,6 +55,14 @@ class RepoFileCombiner:
             '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.ttf', '.otf', '.woff',
             '.woff2', '.db', '.sqlite', '.mdb', '.pyc', '.class', '.o', '.obj'
         ]
+        # Files larger than this are skipped without being read (None disables the limit)
+        self.max_file_size = 10 * 1024 * 1024
+        # (relative_path, size, reason) for files the last run skipped by sniffing or size
+        self.skipped_files = []
+        # (relative_path, original_path, bytes_saved, tokens_saved) for files the last run replaced by a reference
+        self.duplicate_files = []
+        # Threads that open and read upcoming files while the writer appends earlier ones (1 reads inline)
+        self.read_workers = 8
 
     def select_repository(self, repo_path):
         """Set the repository path."""
@@ -31,8 +78,441 @@ class RepoFileCombiner:
         # Otherwise, only include files with approved extensions
         return file_ext in [ext if ext.startswith('.') else f'.{ext}' for ext in approved_extensions]
 
-    def combine_files(self, approved_extensions=None):
-        """Combine files from the repository into a single file based on approved extensions."""
+    def _select(self, entries, approved_extensions, all_exclusions):
+        """Yield (entry, relative_path) for every file that passes the name, directory and extension filters."""
+        for entry in entries:
+            if any(exclusion in entry.name for exclusion in all_exclusions):
+                continue
+            if all_exclusions.intersection(entry.rel_path.split('/')[:-1]):
+                continue
+            if not self.is_approved_file(entry.path, approved_extensions):
+                continue
+            # Same as os.path.relpath(entry.path, self.current_repo_path), without re-normalizing both paths
+            yield entry, entry.rel_path.replace('/', os.sep)
+
+    def _fetch(self, path):
+        """Open, sniff and (if small) read one file, returning (kind, size, payload).
+
+        kind is 'text' with the file's bytes, 'stream' with (open file, sniff
+        sample) for files too big to hold in memory, 'too large' or 'binary' for
+        skipped files, 'open error' if the file could not be opened or sniffed,
+        and 'read error' if reading failed after that. Only this method touches
+        the source file system, so it can run on read-ahead threads.
+        """
+        try:
+            infile = open(path, 'rb')
+        except (PermissionError, IOError) as e:
+            return 'open error', 0, e
+        try:
+            try:
+                size = os.fstat(infile.fileno()).st_size
+                if self.max_file_size is not None and size > self.max_file_size:
+                    return 'too large', size, None
+                sample = infile.read(BINARY_SNIFF_BYTES)
+            except (PermissionError, IOError) as e:
+                return 'open error', 0, e
+            if looks_binary(sample):
+                return 'binary', size, None
+            if size > PREFETCH_MAX_BYTES:
+                stream, infile = infile, None
+                return 'stream', size, (stream, sample)
+            try:
+                return 'text', size, sample + infile.read()
+            except (PermissionError, IOError) as e:
+                return 'read error', size, e
+        finally:
+            if infile is not None:
+                infile.close()
+
+    def _fetch_all(self, selected, reuse=None):
+        """Yield (relative_path, fetched) in input order while up to read_workers threads read ahead.
+
+        Files whose relative path is in reuse are not read; they come back as
+        ('reuse', size, record) with the record from reuse.
+        """
+        reuse = reuse or {}
+        if self.read_workers <= 1:
+            for entry, relative_path in selected:
+                record = reuse.get(relative_path)
+                yield relative_path, ('reuse', record["size"], record) if record else self._fetch(entry.path)
+            return
+
+        window = deque()
+        with ThreadPoolExecutor(self.read_workers) as pool:
+            try:
+                for entry, relative_path in selected:
+                    record = reuse.get(relative_path)
+                    if record:
+                        window.append((relative_path, None, ('reuse', record["size"], record)))
+                    else:
+                        window.append((relative_path, pool.submit(self._fetch, entry.path), None))
+                    if len(window) >= self.read_workers * PREFETCH_WINDOW:
+                        relative_path, future, fetched = window.popleft()
+                        yield relative_path, future.result() if future else fetched
+                while window:
+                    relative_path, future, fetched = window.popleft()
+                    yield relative_path, future.result() if future else fetched
+            finally:
+                # Close streams opened ahead of a writer that stopped early
+                for _, future, _ in window:
+                    if future:
+                        kind, _, payload = future.result()
+                        if kind == 'stream':
+                            payload[0].close()
+
+    def _skip_line(self, relative_path, error):
+        return f"Skipped {relative_path} due to error: {str(error)}\n"
+
+    def _header(self, relative_path):
+        return f"FILE PATH: {relative_path}\n" + "=" * 50 + "\n"
+
+    def _reference(self, relative_path, original_path):
+        """Section written in place of a file whose bytes match an earlier file in the output."""
+        return self._header(relative_path) + f"(identical to {original_path})" + SECTION_END
+
+    def _record_duplicate(self, relative_path, original_path, section_bytes, section_chars):
+        """Return the reference section for a duplicate and record what it saves, or None if it saves nothing."""
+        reference = self._reference(relative_path, original_path)
+        saved = section_bytes - len(reference.encode('utf-8'))
+        if saved <= 0:
+            # Tiny files are cheaper to repeat than to reference
+            return None
+        self.duplicate_files.append((
+            relative_path, original_path, saved,
+            estimate_tokens(section_chars) - estimate_tokens(reference),
+        ))
+        return reference
+
+    def _iter_sections(self, entries, approved_extensions, all_exclusions, dedup=False):
+        """Yield (relative_path, section_text) for every file that goes into the combined output.
+
+        With dedup, a file whose bytes match an earlier file yields a short
+        reference to it instead of its content.
+        """
+        selected = list(self._select(entries, approved_extensions, all_exclusions))
+        colliding = colliding_sizes(entry for entry, _ in selected) if dedup else set()
+        seen = {}
+        for relative_path, (kind, size, payload) in self._fetch_all(selected):
+            header = self._header(relative_path)
+            if kind in ('too large', 'binary'):
+                self.skipped_files.append((relative_path, size, kind))
+                continue
+            if kind == 'open error':
+                yield relative_path, self._skip_line(relative_path, payload)
+                continue
+            if kind == 'read error':
+                # The header was already written when the old writer hit a read error
+                yield relative_path, header + self._skip_line(relative_path, payload)
+                continue
+            try:
+                if kind == 'stream':
+                    infile, sample = payload
+                    with infile:
+                        payload = sample + infile.read()
+                content = decode_text(payload)
+            except (UnicodeDecodeError, PermissionError, IOError) as e:
+                yield relative_path, header + self._skip_line(relative_path, e)
+                continue
+            section = header + content + SECTION_END
+            if size in colliding:
+                digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+                if digest in seen:
+                    section = self._record_duplicate(relative_path, seen[digest], len(section.encode('utf-8')),
+                                                     len(section)) or section
+                else:
+                    seen[digest] = relative_path
+            yield relative_path, section
+
+    def _copy_section(self, outfile, relative_path, fetched, digest=None):
+        """Write one fetched file's section to a binary outfile without decoding it to a str.
+
+        Produces exactly the bytes _iter_sections would; a file that turns out not
+        to be UTF-8 part-way through is truncated back to its header. digest, if
+        given, is fed the file's raw bytes. Returns the section's length in
+        characters when the whole file made it into the output, else None.
+        """
+        kind, size, payload = fetched
+        if kind in ('too large', 'binary'):
+            self.skipped_files.append((relative_path, size, kind))
+            return None
+        if kind == 'open error':
+            outfile.write(self._skip_line(relative_path, payload).encode('utf-8'))
+            return None
+        header = self._header(relative_path)
+        outfile.write(header.encode('utf-8'))
+        if kind == 'read error':
+            outfile.write(self._skip_line(relative_path, payload).encode('utf-8'))
+            return None
+        content_start = outfile.tell()
+        try:
+            if kind == 'stream':
+                infile, sample = payload
+                with infile:
+                    chars = copy_text(infile, outfile, sample, digest=digest)
+            else:
+                chars = copy_text(io.BytesIO(), outfile, payload, digest=digest)
+        except (UnicodeDecodeError, PermissionError, IOError) as e:
+            outfile.seek(content_start)
+            outfile.truncate()
+            outfile.write(self._skip_line(relative_path, e).encode('utf-8'))
+            return None
+        outfile.write(SECTION_END.encode('utf-8'))
+        return len(header) + chars + len(SECTION_END)
+
+    def _dedup_section(self, outfile, start, relative_path, digest, chars, seen):
+        """Replace the section just written from start with a reference if its digest was seen before.
+
+        Returns the path of the earlier identical file, or None if this is the first copy.
+        """
+        original_path = seen.get(digest)
+        if original_path is None:
+            seen[digest] = relative_path
+            return None
+        reference = self._record_duplicate(relative_path, original_path, outfile.tell() - start, chars)
+        if reference is None:
+            return None
+        outfile.seek(start)
+        outfile.truncate()
+        outfile.write(reference.encode('utf-8'))
+        return original_path
+
+    def _staged_content(self, section, relative_path):
+        """Return (size, hash) of the content staged in the section file, as it goes into the output.
+
+        That is the UTF-8 text after newline normalization, so it can differ
+        from the file on disk when the file has CRLF or CR line endings. The
+        file position is left at the end, where _dedup_section expects it.
+        """
+        header_length = len(self._header(relative_path).encode('utf-8'))
+        size = section.seek(0, os.SEEK_END) - header_length - len(SECTION_END.encode('utf-8'))
+        section.seek(header_length)
+        digest = hashlib.blake2b(digest_size=16)
+        remaining = size
+        while remaining:
+            chunk = section.read(min(remaining, COPY_CHUNK_BYTES))
+            remaining -= len(chunk)
+            digest.update(chunk)
+        section.seek(0, os.SEEK_END)
+        return size, digest.hexdigest()
+
+    def _write_record(self, outfile, relative_path, fetched, section, content, original_path):
+        """Write one JSONL record for the section staged in the section file.
+
+        Text files carry their content, duplicates name the file they repeat,
+        and unreadable files carry the error; binary and oversized files get no record.
+        content is the (size, hash) from _staged_content, so size and hash describe
+        the emitted, newline-normalized content; error records give the size on disk.
+        """
+        kind, size, _ = fetched
+        if kind in ('too large', 'binary'):
+            return
+        section.seek(0)
+        if content is None:
+            # The staged section is just the header and/or the "Skipped ... due to error" line
+            record = {"path": relative_path, "size": size}
+            line = section.read().decode('utf-8', errors='replace')
+            record["error"] = line.partition(" due to error: ")[2].rstrip('\n')
+            outfile.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+            return
+        record = {"path": relative_path, "size": content[0], "hash": content[1]}
+        if original_path is not None:
+            record["duplicate_of"] = original_path
+            outfile.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+            return
+
+        # The content is streamed into the JSON string chunk by chunk rather than dumped whole
+        header_length = len(self._header(relative_path).encode('utf-8'))
+        outfile.write((json.dumps(record, ensure_ascii=False)[:-1] + ', "content": "').encode('utf-8'))
+        remaining = content[0]
+        section.seek(header_length)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while remaining:
+            chunk = section.read(min(remaining, COPY_CHUNK_BYTES))
+            remaining -= len(chunk)
+            text = decoder.decode(chunk, not remaining)
+            outfile.write(json.dumps(text, ensure_ascii=False)[1:-1].encode('utf-8'))
+        outfile.write(b'"}\n')
+
+    def _write_combined(self, outfile, entries, approved_extensions, all_exclusions, dedup, output_format,
+                        compression):
+        """Write every selected file to outfile as text sections or JSONL records."""
+        selected = list(self._select(entries, approved_extensions, all_exclusions))
+        # Only files that share their size with another file can be duplicates, so only those are hashed
+        colliding = colliding_sizes(entry for entry, _ in selected) if dedup else set()
+        seen = {}
+        # Compressed streams cannot be truncated, so sections are staged where a failed one can be rolled back
+        staged = output_format != 'text' or compression is not None
+        section = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) if staged else outfile
+        try:
+            for relative_path, fetched in self._fetch_all(selected):
+                if staged:
+                    section.seek(0)
+                    section.truncate()
+                start = section.tell()
+                digest = hashlib.blake2b(digest_size=16) if fetched[1] in colliding else None
+                chars = self._copy_section(section, relative_path, fetched, digest)
+                # Measured before dedup replaces the section; a duplicate's content matches its original's
+                content = None
+                if output_format == 'jsonl' and chars is not None:
+                    content = self._staged_content(section, relative_path)
+                original_path = None
+                if dedup and digest and chars is not None:
+                    original_path = self._dedup_section(section, start, relative_path, digest.hexdigest(), chars, seen)
+                if output_format == 'jsonl':
+                    self._write_record(outfile, relative_path, fetched, section, content, original_path)
+                elif staged:
+                    section.seek(0)
+                    shutil.copyfileobj(section, outfile, COPY_CHUNK_BYTES)
+        finally:
+            if staged:
+                section.close()
+
+    def _index_options(self, approved_extensions, all_exclusions):
+        """Settings that change which files are combined; an index built with other settings is not reused."""
+        return {
+            "extensions": sorted({(e if e.startswith('.') else f'.{e}').lower() for e in approved_extensions}),
+            "skip_extensions": sorted(self.skip_extensions),
+            "exclusions": sorted(all_exclusions),
+            "max_file_size": self.max_file_size,
+        }
+
+    def _combine_incremental(self, output_file, entries, approved_extensions, all_exclusions, dedup=False):
+        """Rebuild output_file, copying the sections of unchanged files from the previous output.
+
+        A file is unchanged when its size and mtime match the sidecar index.
+        The new output is written next to the old one and swapped in with
+        os.replace. Returns (sections reused, sections written).
+        """
+        index_path = os.path.join(os.path.dirname(output_file), INDEX_NAME)
+        options = dict(self._index_options(approved_extensions, all_exclusions), dedup=dedup)
+        previous = load_combine_index(index_path, output_file, options)
+
+        selected, reuse, paths = [], {}, {}
+        for entry, relative_path in self._select(entries, approved_extensions, all_exclusions):
+            paths[relative_path] = entry.path
+            # Fresh stat: the snapshot does not notice in-place edits
+            try:
+                st = os.stat(entry.path)
+            except OSError:
+                st = None
+            record = previous.get(relative_path)
+            if st and record and (record["size"], record["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+                reuse[relative_path] = record
+            selected.append((entry, relative_path, st))
+
+        files, reused, written = [], 0, 0
+        stats = {relative_path: st for _, relative_path, st in selected}
+        temp_file = output_file + ".tmp"
+        old = open(output_file, 'rb') if reuse else None
+        try:
+            with open(temp_file, 'wb') as outfile:
+                copier = RangeCopier(old, outfile)
+                seen = {}
+                for relative_path, fetched in self._fetch_all(((e, r) for e, r, _ in selected), reuse):
+                    kind, size, record = fetched
+                    if kind == 'reuse':
+                        if record["kind"] in ('too large', 'binary'):
+                            self.skipped_files.append((relative_path, size, record["kind"]))
+                            files.append(record)
+                            reused += 1
+                            continue
+                        original_path = seen.get(record["hash"]) if dedup else None
+                        reference = original_path and self._record_duplicate(
+                            relative_path, original_path, record["content_length"], record["chars"])
+                        if reference:
+                            # The content is already in this output, so the reference needs no read
+                            copier.flush()
+                            offset = outfile.tell()
+                            outfile.write(reference.encode('utf-8'))
+                            files.append(dict(record, kind='duplicate', original=original_path,
+                                              offset=offset, length=outfile.tell() - offset))
+                            reused += 1
+                            continue
+                        if record["kind"] == 'text':
+                            if dedup:
+                                seen.setdefault(record["hash"], relative_path)
+                            offset = copier.add(record["offset"], record["length"])
+                            files.append(dict(record, offset=offset))
+                            reused += 1
+                            continue
+                        # A duplicate whose original changed or went away needs its own content again
+                        fetched = self._fetch(paths[relative_path])
+                        kind = fetched[0]
+
+                    copier.flush()
+                    st = stats[relative_path]
+                    offset = outfile.tell()
+                    digest = hashlib.blake2b(digest_size=16)
+                    chars = self._copy_section(outfile, relative_path, fetched, digest)
+                    written += 1
+                    if st is None or (chars is None and kind not in ('too large', 'binary')):
+                        # Errors are retried on the next run rather than cached
+                        continue
+                    record = {
+                        "path": relative_path,
+                        "size": st.st_size,
+                        "mtime_ns": st.st_mtime_ns,
+                        "kind": kind if chars is None else 'text',
+                        "offset": offset,
+                    }
+                    if chars is not None:
+                        record.update(hash=digest.hexdigest(), chars=chars, content_length=outfile.tell() - offset)
+                        original_path = dedup and self._dedup_section(
+                            outfile, offset, relative_path, record["hash"], chars, seen)
+                        if original_path:
+                            record.update(kind='duplicate', original=original_path)
+                    record["length"] = outfile.tell() - offset
+                    files.append(record)
+                copier.flush()
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        finally:
+            if old:
+                old.close()
+        os.replace(temp_file, output_file)
+        save_combine_index(index_path, output_file, options, files)
+        return reused, written
+
+    def skipped_report(self):
+        """Summarise files skipped by the binary sniffer or size limit in the last run."""
+        if not self.skipped_files:
+            return ""
+        # Sniffed files still cost their sample read; oversized ones are never opened for reading
+        saved = sum(size - min(size, BINARY_SNIFF_BYTES) if reason == "binary" else size
+                    for _, size, reason in self.skipped_files)
+        lines = [f"\nSkipped {len(self.skipped_files)} binary or oversized file(s), saving {saved:,} bytes of reads:"]
+        lines.extend(f" - {path} ({reason}, {size:,} bytes)" for path, size, reason in self.skipped_files)
+        return "\n".join(lines)
+
+    def duplicate_report(self):
+        """Summarise files the last run replaced by a reference to an identical file."""
+        if not self.duplicate_files:
+            return ""
+        saved_bytes = sum(saved for _, _, saved, _ in self.duplicate_files)
+        saved_tokens = sum(tokens for _, _, _, tokens in self.duplicate_files)
+        lines = [f"\nDeduplicated {len(self.duplicate_files)} identical file(s), "
+                 f"saving {saved_bytes:,} bytes (~{saved_tokens:,} tokens):"]
+        lines.extend(f" - {path} (identical to {original})" for path, original, _, _ in self.duplicate_files)
+        return "\n".join(lines)
+
+    def combine_files(self, approved_extensions=None, shard_budget=None, budget_unit='bytes', incremental=False,
+                      dedup=False, output_format='text', compression=None):
+        """Combine files from the repository into a single file based on approved extensions.
+
+        With a shard_budget, output is streamed into numbered combined_code_NNN.txt
+        shards of at most that many bytes (or estimated tokens when budget_unit is
+        'tokens'), plus combined_code_manifest.json mapping files to shards.
+        With incremental (single-file output only), combined_code_index.json
+        records where each file's section sits, so the next incremental run only
+        re-reads files that changed. With dedup, a file byte-identical to an
+        earlier one is written as a short "identical to <path>" reference.
+        output_format 'jsonl' writes combined_code.jsonl with one record per
+        file (path, size, hash, content), where size and hash are those of the
+        newline-normalized content as emitted; compression 'gzip' or 'zstd' (needs
+        the zstandard package) compresses the single-file output.
+        """
         if not self.current_repo_path:
             return "Please select a repository first"
 
@@ -40,31 +520,334 @@ class RepoFileCombiner:
             self.current_repo_path = os.path.dirname(self.current_repo_path)
             if not os.path.isdir(self.current_repo_path):
                 return f"Invalid repository path: {self.current_repo_path}"
+        if budget_unit not in ('bytes', 'tokens'):
+            return f"Unknown budget unit: {budget_unit}"
+        if output_format not in OUTPUT_FORMATS:
+            return f"Unknown output format: {output_format}"
+        if compression not in COMPRESSIONS:
+            return f"Unknown compression: {compression}"
+        if compression == 'zstd' and zstandard is None:
+            return "zstd compression needs the zstandard package (pip install zstandard)"
+        if (shard_budget or incremental) and (output_format != 'text' or compression):
+            return "Sharded and incremental output only support uncompressed text"
 
         # Default to empty list if None is passed
         approved_extensions = approved_extensions or []
-        output_file = os.path.join(self.current_repo_path, "combined_code.txt")
+        output_file = os.path.join(self.current_repo_path,
+                                   "combined_code" + OUTPUT_FORMATS[output_format] + COMPRESSIONS[compression])
+        index_file = os.path.join(self.current_repo_path, INDEX_NAME)
         all_exclusions = set(self.default_exclusions)
+        # Outputs of any format must never be combined into another run
+        outputs = [os.path.join(self.current_repo_path, "combined_code" + fmt + comp)
+                   for fmt in OUTPUT_FORMATS.values() for comp in COMPRESSIONS.values()]
+        outputs += [index_file] + [path + ".tmp" for path in outputs + [index_file]]
+        # List before opening the output, so creating it does not invalidate the session snapshot
+        entries = [
+            e for e in list_files(self.current_repo_path, exclude_paths=outputs)
+            if not SHARD_NAME.fullmatch(e.name)
+        ]
+        self.skipped_files = []
+        self.duplicate_files = []
 
         try:
-            with open(output_file, 'w', encoding='utf-8') as outfile:
-                for root_dir, dirs, files in os.walk(self.current_repo_path):
-                    dirs[:] = [d for d in dirs if d not in all_exclusions]
-                    for file in files:
-                        if any(exclusion in file for exclusion in all_exclusions):
-                            continue
-                        full_path = os.path.join(root_dir, file)
-                        if not self.is_approved_file(full_path, approved_extensions):
-                            continue
-                        relative_path = os.path.relpath(full_path, self.current_repo_path)
-                        try:
-                            with open(full_path, 'r', encoding='utf-8') as infile:
-                                outfile.write(f"FILE PATH: {relative_path}\n")
-                                outfile.write("=" * 50 + "\n")
-                                outfile.write(infile.read())
-                                outfile.write("\n\n" + "="*80 + "\n\n")
-                        except (UnicodeDecodeError, PermissionError, IOError) as e:
-                            outfile.write(f"Skipped {relative_path} due to error: {str(e)}\n")
-            return f"Files combined successfully. Output saved to {output_file}"
+            if shard_budget:
+                # Shards are measured and split in characters, so this path works on decoded sections
+                writer = ShardWriter(self.current_repo_path, shard_budget, budget_unit)
+                sections = self._iter_sections(entries, approved_extensions, all_exclusions, dedup)
+                for relative_path, section in sections:
+                    writer.add(relative_path, section)
+                manifest_path = writer.close()
+                return (f"Files combined successfully into {len(writer.shards)} shard(s). "
+                        f"Manifest saved to {manifest_path}" + self.duplicate_report() + self.skipped_report())
+
+            if incremental:
+                reused, written = self._combine_incremental(output_file, entries, approved_extensions,
+                                                            all_exclusions, dedup)
+                return (f"Files combined successfully. Output saved to {output_file} "
+                        f"({reused} section(s) reused, {written} rewritten)"
+                        + self.duplicate_report() + self.skipped_report())
+
+            with open_output(output_file, compression) as outfile:
+                self._write_combined(outfile, entries, approved_extensions, all_exclusions, dedup, output_format,
+                                     compression)
+            return (f"Files combined successfully. Output saved to {output_file}"
+                    + self.duplicate_report() + self.skipped_report())
         except Exception as e:
             return f"An error occurred: {str(e)}"
+
+
+def open_output(path, compression=None):
+    """Open a binary output file, compressed with gzip or zstd if asked."""
+    if compression == 'gzip':
+        # A fixed mtime keeps the output identical across runs over the same files
+        return gzip.GzipFile(path, 'wb', compresslevel=6, mtime=0)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'))
+    return open(path, 'wb')
+
+
+def looks_binary(sample):
+    """Guess from the first bytes of a file whether it is binary rather than UTF-8 text."""
+    if not sample:
+        return False
+    if b'\0' in sample:
+        return True
+    try:
+        # final=False tolerates a multi-byte character cut off at the end of the sample
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return True
+    control = sample.translate(None, TEXT_BYTES)
+    return len(control) / len(sample) > BINARY_CONTROL_RATIO
+
+
+def decode_text(data):
+    """Decode UTF-8 bytes with the universal-newline handling of text-mode open()."""
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+class StreamDecodeError(UnicodeDecodeError):
+    """UnicodeDecodeError from one chunk of a stream, reported at its position in the whole stream."""
+
+    def __init__(self, error, offset):
+        super().__init__(error.encoding, error.object, error.start, error.end, error.reason)
+        self.offset = offset
+
+    def __str__(self):
+        start, end = self.start + self.offset, self.end + self.offset
+        if end - start == 1:
+            return (f"'{self.encoding}' codec can't decode byte 0x{self.object[self.start]:02x} "
+                    f"in position {start}: {self.reason}")
+        return f"'{self.encoding}' codec can't decode bytes in position {start}-{end - 1}: {self.reason}"
+
+
+def copy_text(infile, outfile, head=b'', chunk_size=COPY_CHUNK_BYTES, digest=None):
+    """Copy UTF-8 bytes from infile to outfile in chunks, validating and normalizing newlines as decode_text does.
+
+    head is data already read from infile (such as the binary sniff sample);
+    digest, if given, is updated with the raw bytes read.
+    Memory use is bounded by chunk_size whatever the file size. Returns the
+    number of characters written; raises StreamDecodeError on invalid UTF-8, in
+    which case part of the file may already have been written.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    consumed = chars = 0
+    carry = b''
+    chunk = head or infile.read(chunk_size)
+    while True:
+        next_chunk = infile.read(chunk_size) if chunk else b''
+        final = not next_chunk
+        pending = decoder.getstate()[0]
+        try:
+            chars += len(decoder.decode(chunk, final))
+        except UnicodeDecodeError as e:
+            raise StreamDecodeError(e, consumed - len(pending)) from None
+        consumed += len(chunk)
+        if digest is not None:
+            digest.update(chunk)
+
+        data = carry + chunk
+        # A '\r' at a chunk boundary may be the first half of '\r\n'
+        carry = b'\r' if not final and data.endswith(b'\r') else b''
+        if carry:
+            data = data[:-1]
+        if b'\r' in data:
+            normalized = data.replace(b'\r\n', b'\n')
+            # Each dropped '\r' was one decoded character
+            chars -= len(data) - len(normalized)
+            data = normalized.replace(b'\r', b'\n')
+        outfile.write(data)
+        if final:
+            return chars
+        chunk = next_chunk
+
+
+class RangeCopier:
+    """Copies byte ranges of an old output into a new one, merging adjacent ranges into one copy."""
+
+    def __init__(self, source, outfile):
+        self.source = source
+        self.outfile = outfile
+        self._start = self._end = None
+        self._written = 0
+
+    def add(self, offset, length):
+        """Queue source[offset:offset + length] for copying; returns its offset in the new output."""
+        if self._start is not None and offset != self._end:
+            self.flush()
+        if self._start is None:
+            self._start, self._end = offset, offset
+            self._written = self.outfile.tell()
+        new_offset = self._written + (self._end - self._start)
+        self._end = offset + length
+        return new_offset
+
+    def flush(self):
+        """Copy the pending range, in the kernel where os.copy_file_range is available."""
+        if self._start is None:
+            return
+        offset, remaining = self._start, self._end - self._start
+        self._start = self._end = None
+        self.outfile.flush()
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while remaining:
+                    copied = os.copy_file_range(self.source.fileno(), self.outfile.fileno(), remaining, offset)
+                    if not copied:
+                        break
+                    offset += copied
+                    remaining -= copied
+            except OSError:
+                # Not supported between these files; fall back to a user-space copy
+                pass
+            # The buffered writer does not know the descriptor moved
+            self.outfile.seek(0, os.SEEK_END)
+        self.source.seek(offset)
+        while remaining:
+            chunk = self.source.read(min(remaining, COPY_CHUNK_BYTES))
+            if not chunk:
+                raise IOError("Previous combined output is shorter than its index")
+            self.outfile.write(chunk)
+            remaining -= len(chunk)
+
+
+def load_combine_index(index_path, output_file, options):
+    """Return {relative_path: record} from a sidecar index that still matches output_file, else {}."""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        st = os.stat(output_file)
+    except (OSError, ValueError):
+        return {}
+    if index.get("version") != INDEX_VERSION or index.get("options") != options:
+        return {}
+    # An output edited or regenerated since the index was written cannot be copied from
+    if index.get("output") != {"size": st.st_size, "mtime_ns": st.st_mtime_ns}:
+        return {}
+    return {record["path"]: record for record in index.get("files", [])}
+
+
+def save_combine_index(index_path, output_file, options, files):
+    """Write the sidecar index for a freshly written output_file."""
+    st = os.stat(output_file)
+    temp_path = index_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        # dumps runs in the C encoder; dump to a file would go through the slow pure-Python path
+        f.write(json.dumps({
+            "version": INDEX_VERSION,
+            "options": options,
+            "output": {"size": st.st_size, "mtime_ns": st.st_mtime_ns},
+            "files": files,
+        }))
+    os.replace(temp_path, index_path)
+
+
+def estimate_tokens(text):
+    """Rough token count for LLM context budgeting (about 4 characters per token); also takes a character count."""
+    length = text if isinstance(text, int) else len(text)
+    return (length + 3) // 4
+
+
+def colliding_sizes(entries):
+    """Return the non-zero sizes shared by more than one entry; only files of those sizes can have a twin."""
+    counts = Counter(entry.size for entry in entries)
+    return {size for size, count in counts.items() if count > 1 and size}
+
+
+class ShardWriter:
+    """Streams combined sections into numbered shard files capped by a byte or token budget."""
+
+    def __init__(self, output_dir, budget, unit='bytes', prefix="combined_code"):
+        self.output_dir = output_dir
+        self.budget = int(budget)
+        self.unit = unit
+        self.prefix = prefix
+        self.shards = []
+        self.files = []
+        self._out = None
+        self._used = 0
+
+    def _measure(self, text):
+        return estimate_tokens(text) if self.unit == 'tokens' else len(text.encode('utf-8'))
+
+    def _open_next(self):
+        if self._out:
+            self._out.close()
+        path = os.path.join(self.output_dir, f"{self.prefix}_{len(self.shards) + 1:03d}.txt")
+        self._out = open(path, 'wb')
+        self.shards.append(path)
+        self._used = 0
+
+    def _write(self, relative_path, text, part=None, parts=None):
+        data = text.encode('utf-8')
+        record = {
+            "path": relative_path,
+            "shard": os.path.basename(self.shards[-1]),
+            "offset": self._out.tell(),
+            "length": len(data),
+        }
+        if parts:
+            record.update(part=part, parts=parts)
+        self._out.write(data)
+        self._used += self._measure(text)
+        self.files.append(record)
+
+    def add(self, relative_path, section):
+        """Append one file's section, moving to a new shard first if it would not fit."""
+        size = self._measure(section)
+        if size <= self.budget:
+            if self._out is None or (self._used and self._used + size > self.budget):
+                self._open_next()
+            self._write(relative_path, section)
+            return
+
+        # Only a file that is over budget on its own is split, at line boundaries where possible
+        pieces, current, current_size = [], [], 0
+        for line in section.splitlines(keepends=True):
+            line_size = self._measure(line)
+            while line_size > self.budget:
+                # A single line longer than the budget is cut into budget-sized slices
+                if self.unit == 'tokens':
+                    head = line[:self.budget * 4]
+                else:
+                    head = line.encode('utf-8')[:self.budget].decode('utf-8', errors='ignore') or line[:1]
+                if current:
+                    pieces.append(''.join(current))
+                    current, current_size = [], 0
+                pieces.append(head)
+                line = line[len(head):]
+                line_size = self._measure(line)
+            if current and current_size + line_size > self.budget:
+                pieces.append(''.join(current))
+                current, current_size = [], 0
+            if line:
+                current.append(line)
+                current_size += line_size
+        if current:
+            pieces.append(''.join(current))
+
+        for i, piece in enumerate(pieces, 1):
+            if self._out is None or self._used:
+                self._open_next()
+            self._write(relative_path, piece, i, len(pieces))
+
+    def close(self):
+        """Finish the last shard and write the manifest; returns the manifest path."""
+        if self._out:
+            self._out.close()
+            self._out = None
+        # Remove higher-numbered shards left over from a larger earlier run
+        current = {os.path.basename(p) for p in self.shards}
+        for name in os.listdir(self.output_dir):
+            if name.startswith(f"{self.prefix}_") and name.endswith(".txt") and name[len(self.prefix) + 1:-4].isdigit() \
+                    and name not in current:
+                os.remove(os.path.join(self.output_dir, name))
+        manifest_path = os.path.join(self.output_dir, f"{self.prefix}_manifest.json")
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "budget": self.budget,
+                "unit": self.unit,
+                "shards": [os.path.basename(p) for p in self.shards],
+                "files": self.files,
+            }, f, indent=2)
+        return manifest_path
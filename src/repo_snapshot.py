@@ -0,0 +1,77 @@
+# repo_snapshot.py
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+from repo_walker import FileEntry, walk_repo
+
+
+class RepoSnapshot:
+    """File list of one repository as walk_repo saw it, plus the directory mtimes used to detect changes."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.dir_mtimes: Dict[str, int] = {}
+        self.entries: List[FileEntry] = list(walk_repo(self.root, dir_mtimes=self.dir_mtimes))
+
+    def is_fresh(self) -> bool:
+        """Check that no directory gained, lost or renamed an entry since the snapshot.
+
+        Only directories are stat'ed; in-place edits to a file's content are not
+        detected, so callers that cache by size/mtime should stat the files they use.
+        """
+        for dir_path, mtime_ns in self.dir_mtimes.items():
+            try:
+                if os.stat(dir_path).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def files(self, extensions: Optional[Iterable[str]] = None, include_hidden: bool = True,
+              exclude_paths: Iterable[str] = ()) -> List[FileEntry]:
+        """Return the snapshot's files filtered the same way walk_repo would filter them."""
+        entries = self.entries
+        if extensions is not None:
+            suffixes = tuple({(e if e.startswith('.') else f'.{e}').lower() for e in extensions})
+            entries = [e for e in entries if e.name.lower().endswith(suffixes)]
+        if not include_hidden:
+            entries = [e for e in entries if not any(part.startswith('.') for part in e.rel_path.split('/'))]
+        exclude_paths = {os.path.abspath(p) for p in exclude_paths}
+        if exclude_paths:
+            entries = [e for e in entries if e.path not in exclude_paths]
+        return entries
+
+
+class SnapshotCache:
+    """Session-wide RepoSnapshot per repository path, shared by every tool and Gradio tab."""
+
+    def __init__(self):
+        self._snapshots: Dict[str, RepoSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def get(self, repo_path: str, refresh: bool = False) -> RepoSnapshot:
+        """Return the cached snapshot for repo_path, re-walking only if refresh is set or a directory changed."""
+        root = os.path.abspath(repo_path)
+        with self._lock:
+            snapshot = self._snapshots.get(root)
+            if refresh or snapshot is None or not snapshot.is_fresh():
+                snapshot = RepoSnapshot(root)
+                self._snapshots[root] = snapshot
+            return snapshot
+
+    def invalidate(self, repo_path: Optional[str] = None) -> None:
+        """Drop the snapshot for repo_path, or every snapshot when no path is given."""
+        with self._lock:
+            if repo_path is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(os.path.abspath(repo_path), None)
+
+
+snapshot_cache = SnapshotCache()
+
+
+def list_files(repo_path: str, extensions: Optional[Iterable[str]] = None, include_hidden: bool = True,
+               exclude_paths: Iterable[str] = ()) -> List[FileEntry]:
+    """Files under repo_path from the session snapshot, filtered by extension and visibility."""
+    return snapshot_cache.get(repo_path).files(extensions, include_hidden, exclude_paths)
@@ -0,0 +1,191 @@
+# repo_walker.py
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Directories no tool should descend into: VCS metadata, dependencies, virtualenvs, caches and build output
+DEFAULT_EXCLUDED_DIRS = frozenset({
+    '.git', '.svn', '.hg', 'node_modules', '.venv', 'venv', '__pycache__', '.mypy_cache',
+    '.pytest_cache', '.ruff_cache', '.tox', '.nox', '.svelte-kit', '.next', '.nuxt', 'dist', 'build',
+})
+IGNORE_FILES = ('.gitignore', '.ignore')
+
+
+class FileEntry(NamedTuple):
+    """A file found by walk_repo, with stat data taken from the cached DirEntry."""
+    path: str
+    rel_path: str
+    name: str
+    size: int
+    mtime_ns: int
+
+
+def _translate(pattern: str) -> str:
+    """Translate one gitignore glob into a regex over '/'-separated relative paths."""
+    regex, i = [], 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            regex.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex.append('/.*')
+            break
+        if c == '*':
+            regex.append('.*' if pattern.startswith('**', i) else '[^/]*')
+            i += 2 if pattern.startswith('**', i) else 1
+            continue
+        if c == '?':
+            regex.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                regex.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                regex.append(f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < len(pattern):
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        else:
+            regex.append(re.escape(c))
+        i += 1
+    return ''.join(regex)
+
+
+class IgnoreRules:
+    """Patterns from one .gitignore/.ignore file, matched against paths relative to its directory."""
+
+    def __init__(self, lines: Iterable[str]):
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip('\r')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if not line.endswith('\\ '):
+                line = line.rstrip()
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            # A slash anywhere but the end anchors the pattern to this directory
+            anchored = '/' in line
+            body = _translate(line.lstrip('/'))
+            regex = re.compile(body if anchored else f'(?:.*/)?{body}')
+            self.rules.append((regex, negated, dir_only))
+
+    @classmethod
+    def from_file(cls, path: str) -> Optional['IgnoreRules']:
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                rules = cls(f)
+        except OSError:
+            return None
+        return rules if rules.rules else None
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Return True (ignored), False (re-included by '!') or None when no pattern applies."""
+        result = None
+        for regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel_path):
+                result = not negated
+        return result
+
+
+def _is_ignored(stack, rel_path: str, is_dir: bool) -> bool:
+    ignored = False
+    # Later (deeper) ignore files override earlier ones, like git
+    for base, rules in stack:
+        local = rel_path[len(base) + 1:] if base else rel_path
+        verdict = rules.match(local, is_dir)
+        if verdict is not None:
+            ignored = verdict
+    return ignored
+
+
+def walk_repo(root: str, extensions: Optional[Iterable[str]] = None,
+              exclude_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+              use_ignore_files: bool = True, include_hidden: bool = True,
+              exclude_paths: Iterable[str] = (),
+              dir_mtimes: Optional[Dict[str, int]] = None) -> Iterator[FileEntry]:
+    """Lazily yield the files under root in sorted, top-down order.
+
+    Excluded and ignored directories are pruned before they are read, and
+    .gitignore/.ignore files are honoured at every level. extensions filters
+    by lower-cased suffix ('.py' or 'py'); exclude_paths skips specific files
+    such as a tool's own output. When dir_mtimes is given it is filled with
+    the mtime of every directory that was read.
+    """
+    root = os.path.abspath(root)
+    exclude_dirs = frozenset(exclude_dirs)
+    exclude_paths = {os.path.abspath(p) for p in exclude_paths}
+    if extensions is not None:
+        extensions = tuple({(e if e.startswith('.') else f'.{e}').lower() for e in extensions})
+
+    try:
+        root_mtime = os.stat(root).st_mtime_ns
+    except OSError:
+        return
+    pending = [(root, '', [], root_mtime)]
+    while pending:
+        dir_path, rel_dir, stack, mtime_ns = pending.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        if dir_mtimes is not None:
+            dir_mtimes[dir_path] = mtime_ns
+
+        if use_ignore_files:
+            names = {e.name for e in entries}
+            for ignore_file in IGNORE_FILES:
+                if ignore_file in names:
+                    rules = IgnoreRules.from_file(os.path.join(dir_path, ignore_file))
+                    if rules:
+                        stack = stack + [(rel_dir, rules)]
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            if not include_hidden and name.startswith('.'):
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if name in exclude_dirs or (stack and _is_ignored(stack, rel_path, True)):
+                    continue
+                try:
+                    subdir_mtime = entry.stat(follow_symlinks=False).st_mtime_ns
+                except OSError:
+                    continue
+                subdirs.append((entry.path, rel_path, stack, subdir_mtime))
+                continue
+            if extensions is not None and not name.lower().endswith(extensions):
+                continue
+            if stack and _is_ignored(stack, rel_path, False):
+                continue
+            if exclude_paths and entry.path in exclude_paths:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            yield FileEntry(entry.path, rel_path, name, st.st_size, st.st_mtime_ns)
+
+        # Reverse so the stack pops subdirectories in sorted order
+        pending.extend(reversed(subdirs))